@@ -15,8 +15,9 @@ If ``autoinject`` is set, drivers with the same keys as missing argument names
 are automatically instantiated.
 
 Warning:
-     Automatic injection is risky because it relies on naming conventions and
-     is prone to circular dependencies!
+     Automatic injection is risky because it relies on naming conventions!
+     Circular dependencies are detected before any driver of the cycle
+     is instantiated, ``DependencyCycleError`` is raised.
 
 Exceptions of ``TypeError`` resulting from missing arguments are not caught.
 
@@ -33,34 +34,556 @@ accessible as attributes.
 
 Calling ``close`` on driver instance is attempted on every ``__delitem__``.
 
+If ``threadsafe`` is True, singletons are instantiated under per-key locks:
+each is built exactly once when many threads ask for it at the same time,
+while different keys are instantiated concurrently.
+
 When instantiated driver is deleted with ``cascade_delete``, also deleted are
 instances of drivers that have given key in their signature.
 
 All instances are deleted on ``__exit__`` (with ``close`` attempted).
 
+Singleton instances may be evicted: when older than ``ttl``, when failing
+``health`` check (both checked on access) or when least recently used over
+``max_instances``. Eviction goes through ``cascade_delete``, so dependents
+are deleted too; instances are made again on next access.
+
+Keys listed in ``pools`` are also served by bounded pools of instances:
+``with pack.checkout(key) as inst:`` borrows an idle instance (or makes one)
+and waits when all are in use.
+
+Use ``warmup`` to instantiate singletons in parallel at startup.
+
+Drivers may be coroutine functions (or return awaitables):
+``await pack.aget(key)`` awaits them, and ``async with`` (or ``aclose``)
+awaits ``aclose`` or ``close`` of instances on exit.
+
+In a forked child process, instances made before fork are dropped
+(see ``on_fork``). Pickled DriverPack carries its ``spec`` only: drivers,
+options and assigned values, instances are made anew where it is unpickled.
+Use import strings or module-level drivers to keep the pack picklable.
+
+With ``instrument``, driver calls (count and time), cache hits, closes
+and injected arguments are recorded to ``stats``; ``export_graph`` returns
+the live dependency graph as JSON or DOT.
+
+Drivers may be given as import strings, e.g. ``'package.module:Class'``,
+so that modules are imported only when the driver is first instantiated.
+
+Driver signatures are inspected once: the pack is compiled into
+``DriverGraph`` with forward (argument) and reverse (dependent) edges,
+which is recompiled only after the pack has changed.
+
 """
 
+import asyncio
 import collections
+import contextlib
+import functools
+import importlib
 import inspect
+import json
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DependencyCycleError(RecursionError):
+    """Raised when autoinjected drivers depend on each other in a cycle."""
+
+
+def close_instance(inst):
+    """Attempts to call ``close`` of driver instance."""
+    try:
+        inst.close()
+    except (AttributeError, TypeError):
+        pass
+
+
+class PackDict(dict):
+    """Dictionary of key-driver pairs that counts its changes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.version += 1
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+
+def import_driver(spec):
+    """Imports driver given as ``'package.module:name'`` string."""
+    module_name, sep, qualname = spec.partition(':')
+    if not sep:
+        module_name, _, qualname = spec.rpartition('.')
+    driver = importlib.import_module(module_name)
+    for attr in qualname.split('.'):
+        driver = getattr(driver, attr)
+    return driver
+
+
+class DriverGraph:
+    """Compiled signatures and dependencies of drivers in a pack.
+
+    Drivers given as import strings (see ``import_driver``) are imported
+    and compiled on first ``resolve``.
+
+    Args:
+        pack (PackDict): dictionary of key-driver pairs
+
+    Attributes:
+        drivers: key -> driver (imported, if given as string)
+        params: key -> ``{argument: has default}`` of driver signature
+        requires: key -> arguments without default that are pack keys,
+            i.e. candidates for autoinjection
+        dependents: argument -> keys that have it in driver signature
+        pending: key -> drivers not imported (or not inspectable) yet
+        lock: lock held while ``pending`` drivers are resolved
+
+    """
+
+    def __init__(self, pack):
+        self.version = pack.version
+        self.keys = set(pack)
+        self.drivers = {}
+        self.params = {}
+        self.requires = {}
+        self.dependents = collections.defaultdict(set)
+        self.pending = {}
+        self.lock = threading.RLock()
+        for key, driver in pack.items():
+            if isinstance(driver, str):
+                self.pending[key] = driver
+                continue
+            try:
+                self._compile(key, driver)
+            except (ValueError, TypeError):  # raised again on resolve
+                self.pending[key] = driver
+
+    def _compile(self, key, driver):
+        params = {
+            arg: param.default is not param.empty
+            for arg, param in inspect.signature(driver).parameters.items()
+        }
+        self.params[key] = params
+        self.requires[key] = tuple(
+            arg for arg, has_default in params.items()
+            if not has_default and arg in self.keys and arg != key
+        )
+        for arg in params:
+            if arg != key:
+                self.dependents[arg].add(key)
+        self.drivers[key] = driver
+
+    def resolve(self, key):
+        """Returns driver of the key, imports and compiles it if needed."""
+        try:
+            return self.drivers[key]
+        except KeyError:
+            with self.lock:
+                if key not in self.drivers:  # not resolved meanwhile
+                    driver = self.pending[key]
+                    if isinstance(driver, str):
+                        driver = import_driver(driver)
+                    self._compile(key, driver)
+                    del self.pending[key]
+            return self.drivers[key]
+
+    def _requires(self, key):
+        self.resolve(key)
+        return self.requires[key]
+
+    def order(self, key, skip=()):
+        """Returns keys to instantiate, dependencies first, for ``key``
+        to be autoinjected with arguments.
+
+        Args:
+            key: key to instantiate, the last in the list
+            skip: keys that need not be instantiated (have values)
+
+        Raises:
+            DependencyCycleError: if dependencies are circular
+
+        """
+        order, done = [], set()
+        path, stack = [key], [iter(self._requires(key))]
+        while stack:
+            for arg in stack[-1]:
+                if arg in skip or arg in done:
+                    continue
+                if arg in path:
+                    cycle = path[path.index(arg):] + [arg]
+                    raise DependencyCycleError(
+                        "Circular driver dependencies: " +
+                        ' -> '.join(map(str, cycle))
+                    )
+                path.append(arg)
+                stack.append(iter(self._requires(arg)))
+                break
+            else:
+                stack.pop()
+                done.add(path[-1])
+                order.append(path.pop())
+        return order
+
+    def levels(self, keys, skip=()):
+        """Groups ``keys`` and their dependencies into levels: drivers
+        of a level depend only on drivers of previous levels.
+
+        Returns:
+            list of lists of keys
+
+        """
+        level = {}
+        for key in keys:
+            if key in skip:
+                continue
+            for dependency in self.order(key, skip):
+                if dependency not in level:
+                    level[dependency] = 1 + max(
+                        (level[arg] for arg in self.requires[dependency]
+                         if arg in level), default=-1
+                    )
+        levels = [[] for _ in range(1 + max(level.values(), default=-1))]
+        for key, n in level.items():
+            levels[n].append(key)
+        return levels
+
+    def cascade(self, key, alive):
+        """Returns ``key`` and its ``alive`` dependents (recursively),
+        dependents first.
+        """
+        with self.lock:
+            assigned = [k for k in self.pending if k in alive]
+        for pending in assigned:
+            self.resolve(pending)  # value assigned to not imported key
+        order, done = [], {key}
+        path, stack = [key], [iter(self.dependents.get(key, ()))]
+        while stack:
+            for dependent in stack[-1]:
+                if dependent in alive and dependent not in done:
+                    done.add(dependent)
+                    path.append(dependent)
+                    stack.append(iter(self.dependents.get(dependent, ())))
+                    break
+            else:
+                stack.pop()
+                order.append(path.pop())
+        return order
+
+
+class DriverPool:
+    """Bounded pool of driver instances.
+
+    Instances are made by ``factory`` on demand, up to ``size`` at a time,
+    and are reused after release (latest released first).
+
+    Args:
+        factory: callable that returns new instance
+        size: maximum number of instances
+
+    """
+
+    def __init__(self, factory, size):
+        self.factory = factory
+        self.size = size
+        self._idle = []
+        self._lent = set()  # ids of instances in use
+        self._count = 0  # number of instances made and not closed
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """Returns idle or new instance, waits if the pool is exhausted.
+
+        Args:
+            timeout: maximum seconds to wait, None to wait forever
+
+        Raises:
+            TimeoutError: if no instance was released in time
+
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: self._idle or self._count < self.size, timeout):
+                raise TimeoutError(
+                    f"No driver instance available in {timeout} seconds")
+            if self._idle:
+                inst = self._idle.pop()
+                self._lent.add(id(inst))
+                return inst
+            self._count += 1
+        try:
+            inst = self.factory()
+        except BaseException:
+            with self._condition:
+                self._count -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._lent.add(id(inst))
+        return inst
+
+    def release(self, inst):
+        """Returns instance to the pool, closes it if the pool was closed
+        meanwhile.
+        """
+        with self._condition:
+            if id(inst) in self._lent:
+                self._lent.discard(id(inst))
+                self._idle.append(inst)
+                self._condition.notify()
+                return
+        close_instance(inst)
+
+    def reset(self):
+        """Forgets all instances without closing them."""
+        self._idle = []
+        self._lent = set()
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def close(self):
+        """Closes idle instances now and instances in use on release."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._lent = set()
+            self._count = 0
+            self._condition.notify_all()
+        for inst in idle:
+            close_instance(inst)
+
+
+class DriverStats:
+    """Instrumentation records of DriverPack.
+
+    Attributes:
+        instantiations: key -> number of driver calls
+        seconds: key -> total seconds spent in driver calls
+        max_seconds: key -> longest driver call
+        hits: key -> number of lookups served by cached instance or value
+        closes: key -> number of instances deleted
+        edges: (consumer key, argument) -> number of calls, where
+            argument was injected
+
+    """
+
+    def __init__(self):
+        self.instantiations = collections.Counter()
+        self.seconds = collections.defaultdict(float)
+        self.max_seconds = {}
+        self.hits = collections.Counter()
+        self.closes = collections.Counter()
+        self.edges = collections.Counter()
+        self.lock = threading.Lock()
+
+    def instantiated(self, key, seconds, args):
+        with self.lock:
+            self.instantiations[key] += 1
+            self.seconds[key] += seconds
+            self.max_seconds[key] = max(seconds, self.max_seconds.get(key, 0))
+            for arg in args:
+                self.edges[key, arg] += 1
+
+    def hit(self, key):
+        with self.lock:
+            self.hits[key] += 1
+
+    def closed(self, key):
+        with self.lock:
+            self.closes[key] += 1
+
+    def node(self, key):
+        """Returns dictionary of records of the key."""
+        return {
+            'instantiations': self.instantiations[key],
+            'seconds': self.seconds.get(key, 0.),
+            'max_seconds': self.max_seconds.get(key, 0.),
+            'hits': self.hits[key],
+            'closes': self.closes[key]
+        }
+
+
+_forkable = weakref.WeakValueDictionary()  # id -> DriverPack
+
+
+def _after_fork_in_child():
+    for dp in list(_forkable.values()):
+        dp._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class _Fresh:
+    """Container of keys that have (fresh) values in DriverPack."""
+
+    def __init__(self, dp):
+        self.dp = dp
+
+    def __contains__(self, key):
+        return self.dp._fresh(key)
 
 
 class DriverPack(collections.UserDict):
     """Instantiates drivers on demand using pre-injected arguments.
 
     Args:
-            pack (dict):  dictionary of key-driver pairs
+            pack (dict):  dictionary of key-driver pairs, copied to
+                ``pack`` attribute, which is to be used for changes
             singleton (bool): if True, driver instances are reused
+            threadsafe (bool): if True, singletons are instantiated
+                under per-key locks
+            pools (dict): key -> maximum number of instances
+                for keys to be used with ``checkout``
+            ttl (dict): key -> seconds singleton instance lives
+            health (dict): key -> callable that gets singleton instance
+                and returns False if the instance is to be replaced
+            max_instances (int): maximum number of singleton instances,
+                least recently used are evicted
+            on_fork (str): what to do with instances in a forked child
+                process: ``'drop'`` (default) or ``'recreate'`` them,
+                None to keep
+            instrument (bool): if True, instantiations, hits, closes
+                and injected arguments are recorded to ``stats``
 
     """
 
     def __init__(self, pack, singleton=True, autoinject=False,
-                 keys_as_attributes=()):
+                 keys_as_attributes=(), threadsafe=False, pools=None,
+                 ttl=None, health=None, max_instances=None, on_fork='drop',
+                 instrument=False):
         super().__init__()
+        self.stats = DriverStats() if instrument else None
+        self._made = set()  # keys of instances made by the pack
+        self.on_fork = on_fork
+        if on_fork is not None:
+            _forkable[id(self)] = self
+        self.ttl = dict(ttl or {})
+        self.health = dict(health or {})
+        self.max_instances = max_instances
+        self._evicting = bool(ttl or health or max_instances is not None)
+        self._born = collections.OrderedDict()  # key -> time, LRU first
+        self._evict_lock = threading.RLock()
+        self.pools = {
+            key: DriverPool(functools.partial(self.instantiate, key), size)
+            for key, size in (pools or {}).items()
+        }
+        self._graph = None
+        self._threadsafe = threadsafe
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._abuilding = {}  # key -> future of instance being awaited
         self.pack = pack
         self._singleton = singleton
         self._autoinject = autoinject
         self._keys_as_attributes = keys_as_attributes
 
+    @property
+    def pack(self):
+        return self._pack
+
+    @pack.setter
+    def pack(self, pack):
+        self._pack = PackDict(pack)
+        self._graph = None  # versions of distinct packs are not comparable
+
+    @property
+    def graph(self):
+        """Compiled ``DriverGraph`` of the current pack."""
+        graph = self._graph
+        if graph is None or graph.version != self._pack.version:
+            graph = self._graph = DriverGraph(self._pack)
+        return graph
+
+    def __getitem__(self, key):
+        if self._born:
+            self._fresh(key)
+        if self.stats is not None and key in self.data:
+            self.stats.hit(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self._born.pop(key, None)  # not an instance made by the pack
+        self._made.discard(key)
+        super().__setitem__(key, value)
+
+    def _fresh(self, key):
+        """Evicts singleton instance of the key if it expired or failed
+        health check (with dependents), otherwise marks it recently used.
+
+        Returns:
+            True if the key has value
+
+        """
+        with self._evict_lock:
+            born = self._born.get(key)
+            expired = False
+            if born is not None:
+                ttl, health = self.ttl.get(key), self.health.get(key)
+                expired = (
+                    (ttl is not None and time.monotonic() - born > ttl) or
+                    (health is not None and not health(self.data[key]))
+                )
+                if not expired:
+                    self._born.move_to_end(key)
+        if expired:  # key locks are not taken under eviction lock
+            self.cascade_delete(key)
+        return key in self.data
+
+    def _evict_lru(self, keep):
+        """Evicts least recently used instances (with dependents)
+        over ``max_instances``, except those ``keep`` depends on.
+        """
+        victims = []
+        with self._evict_lock:
+            excess = len(self._born) - self.max_instances
+            evicted = set()
+            for victim in list(self._born):
+                if excess <= 0:
+                    break
+                if victim in evicted:
+                    continue
+                targets = self.graph.cascade(victim, self.data)
+                if keep not in targets:
+                    victims.extend(targets)
+                    evicted.update(targets)
+                    excess -= sum(1 for t in targets if t in self._born)
+        for target in victims:  # key locks are not taken under eviction lock
+            del self[target]
+
     def __getattr__(self, item):
         kaa = self._keys_as_attributes
         if (
@@ -71,56 +594,411 @@ class DriverPack(collections.UserDict):
         else:
             return None
 
+    def _build(self, key, graph, built):
+        """Calls driver of the ``key`` with arguments found in data
+        or ``built`` by autoinjection.
+        """
+        driver = graph.resolve(key)
+        dynamic_args = {}
+        for arg, has_default in graph.params[key].items():
+            if arg in self.data:
+                dynamic_args[arg] = self.data[arg]
+            elif (
+                    self._autoinject and
+                    not has_default and
+                    arg in built and
+                    not key == arg  # avoid self-dependency
+            ):  # ok, autoinject
+                dynamic_args[arg] = built[arg]
+        if self.stats is None:
+            return driver(**dynamic_args)
+        start = time.perf_counter()
+        inst = driver(**dynamic_args)
+        if not inspect.isawaitable(inst):  # else timed by _abuild
+            self.stats.instantiated(
+                key, time.perf_counter() - start, dynamic_args)
+        return inst
+
     def instantiate(self, key):
         """Instantiates driver given its key.
 
+        With ``autoinject``, missing dependencies are instantiated first,
+        in topological order (and cached, if ``singleton``).
+
         Returns:
             driver instance or None, if no driver is set to serve this key
 
+        Raises:
+            DependencyCycleError: if autoinjected dependencies are circular
+
         """
         if key not in self.pack:
             return None
-        driver = self.pack[key]
-        dynamic_args = {}
-        sig = inspect.signature(driver)
-        for arg, param in sig.parameters.items():
-            if arg in self.data:
-                dynamic_args[arg] = self.data[arg]
-            elif (
-                    self._autoinject and
-                    param.default is param.empty and
-                    arg in self.pack and
-                    not key == arg  # avoid self-dependency
-            ):  # ok, try autoinject
-                dynamic_args[arg] = self.get(arg)  # __missing__ will fire
-        return driver(**dynamic_args)
+        graph = self.graph
+        if not self._autoinject:
+            return self._build(key, graph, {})
+        built = {}
+        skip = _Fresh(self) if self._born else self.data
+        for dependency in graph.order(key, skip=skip)[:-1]:
+            if self._singleton:
+                built[dependency] = self._cache(
+                    dependency, self._build, dependency, graph, built)
+            else:
+                built[dependency] = self._build(dependency, graph, built)
+        return self._build(key, graph, built)
 
-    def __missing__(self, key):
-        inst = self.instantiate(key)
-        if self._singleton and inst is not None:
+    def warmup(self, keys=None, workers=None):
+        """Instantiates singletons ahead of use, independent ones
+        in parallel threads, one dependency level at a time.
+
+        Args:
+            keys: keys to instantiate (with dependencies, if ``autoinject``),
+                all pack keys if None
+            workers: maximum number of threads
+
+        Returns:
+            dictionary of key -> instantiation time in seconds
+            for keys instantiated by this call
+
+        """
+        if not self._singleton:
+            raise ValueError("Warm-up requires singleton DriverPack")
+        graph = self.graph
+        if keys is None:
+            keys = list(self.pack)
+        keys = [key for key in keys if key in self.pack]
+        if self._autoinject:
+            levels = graph.levels(keys, skip=self.data)
+        else:
+            levels = [[key for key in keys if key not in self.data]]
+
+        def timed(key):
+            start = time.perf_counter()
+            self[key]
+            return time.perf_counter() - start
+
+        timings = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for level in levels:
+                for key, seconds in zip(level, executor.map(timed, level)):
+                    timings[key] = seconds
+        return timings
+
+    def _key_lock(self, key):
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.RLock()
+            return lock
+
+    def _cache(self, key, factory, *args):
+        """Returns singleton instance of the key made by ``factory``,
+        which is called once, if ``threadsafe``, even under contention.
+        """
+        if not self._threadsafe:
+            inst = self._store(key, factory(*args))
+        else:
+            with self._key_lock(key):
+                if key in self.data:  # made by another thread meanwhile
+                    return self.data[key]
+                inst = self._store(key, factory(*args))
+        if inst is not None and self.max_instances is not None:
+            self._evict_lru(key)  # after the key lock is released
+        return inst
+
+    def _store(self, key, inst):
+        if inst is not None:
             self.data[key] = inst
+            self._made.add(key)
+            if self._evicting:
+                with self._evict_lock:
+                    self._born[key] = time.monotonic()
+                    self._born.move_to_end(key)
         return inst
 
+    def __missing__(self, key):
+        if self._singleton:
+            return self._cache(key, self.instantiate, key)
+        return self.instantiate(key)
+
     def __delitem__(self, key):
+        if self._threadsafe:
+            with self._key_lock(key):
+                self._close(key)
+        else:
+            self._close(key)
+
+    def _close(self, key):
         if key in self.data:
-            try:
-                self.data[key].close()
-            except (AttributeError, TypeError):
-                pass
+            if self.stats is not None and key in self._made:
+                self.stats.closed(key)
+            close_instance(self.data[key])
             super().__delitem__(key)
+            self._born.pop(key, None)
+            self._made.discard(key)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.clear()
+        self.close()
+
+    def _after_fork(self):
+        """Drops instances inherited by child process (without closing,
+        they are shared with parent) and locks, recreates instances
+        if ``on_fork`` is 'recreate'.
+        """
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._evict_lock = threading.RLock()
+        self._abuilding = {}
+        if self.stats is not None:
+            self.stats.lock = threading.Lock()
+        if self._graph is not None:
+            self._graph.lock = threading.RLock()
+        for pool in self.pools.values():
+            pool.reset()
+        made = [key for key in self.data if key in self._made]
+        for key in made:
+            del self.data[key]
+            self._born.pop(key, None)
+        self._made.clear()
+        if self.on_fork == 'recreate':
+            for key in made:
+                try:
+                    self[key]
+                except Exception:  # will be made on next access
+                    pass
+
+    def spec(self):
+        """Returns picklable specification of the pack: drivers, options
+        and assigned values, but not instances.
+        """
+        return {
+            'pack': dict(self.pack),
+            'values': {
+                k: v for k, v in self.data.items() if k not in self._made
+            },
+            'options': {
+                'singleton': self._singleton,
+                'autoinject': self._autoinject,
+                'keys_as_attributes': self._keys_as_attributes,
+                'threadsafe': self._threadsafe,
+                'pools': {key: pool.size for key, pool in self.pools.items()},
+                'ttl': self.ttl,
+                'health': self.health,
+                'max_instances': self.max_instances,
+                'on_fork': self.on_fork,
+                'instrument': self.stats is not None
+            }
+        }
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Creates DriverPack from ``spec``, instances are made on demand.
+        """
+        dp = cls(spec['pack'], **spec['options'])
+        dp.update(spec['values'])
+        return dp
+
+    def export_graph(self, fmt='json'):
+        """Exports live dependency graph.
+
+        Nodes are pack keys and assigned values, with their state
+        (``instance``, ``value``, ``driver`` not instantiated yet or
+        ``pending`` import) and ``stats`` records, if instrumented.
+        Edges lead from consumer to argument found in its signature,
+        with number of calls it was injected in, if instrumented.
+
+        Args:
+            fmt: 'json' or 'dot' (Graphviz)
+
+        Returns:
+            string
+
+        """
+        graph = self.graph
+        nodes = []
+        for key in {**dict.fromkeys(self.pack), **dict.fromkeys(self.data)}:
+            if key in self.data:
+                state = 'instance' if key in self._made else 'value'
+            else:
+                state = 'pending' if key in graph.pending else 'driver'
+            node = {'key': key, 'state': state}
+            if self.stats is not None:
+                node.update(self.stats.node(key))
+            nodes.append(node)
+        edges = []
+        for key, params in graph.params.items():
+            for arg in params:
+                if arg != key and (arg in self.pack or arg in self.data):
+                    edge = {'consumer': key, 'argument': arg}
+                    if self.stats is not None:
+                        edge['injected'] = self.stats.edges[key, arg]
+                    edges.append(edge)
+        if fmt == 'json':
+            return json.dumps({'nodes': nodes, 'edges': edges}, indent=2,
+                              default=str)
+        elif fmt == 'dot':
+            def quote(value):
+                return json.dumps(str(value))
+            lines = ['digraph DriverPack {']
+            styles = {'instance': 'filled', 'value': 'dotted',
+                      'driver': 'solid', 'pending': 'dashed'}
+            for node in nodes:
+                label = str(node['key'])
+                calls = node.get('instantiations')
+                if calls:
+                    label += f"\n{calls} x {node['seconds'] / calls:.3g} s"
+                lines.append(f"  {quote(node['key'])} [label={quote(label)}, "
+                             f"style={styles[node['state']]}];")
+            for edge in edges:
+                attrs = ''
+                if edge.get('injected'):
+                    attrs = f" [label={edge['injected']}]"
+                lines.append(f"  {quote(edge['consumer'])} -> "
+                             f"{quote(edge['argument'])}{attrs};")
+            lines.append('}')
+            return '\n'.join(lines) + '\n'
+        else:
+            raise ValueError(f"Unknown graph format: '{fmt}'")
+
+    def __reduce__(self):
+        return self.__class__.from_spec, (self.spec(),)
+
+    def clear(self):
+        """Deletes all instances, latest first, without health checks
+        or counting hits.
+        """
+        for key in reversed(list(self.data)):
+            del self[key]
 
     def close(self):
+        """Deletes all instances, closes pooled ones."""
         self.clear()
+        for pool in self.pools.values():
+            pool.close()
+
+    @contextlib.contextmanager
+    def checkout(self, key, timeout=None):
+        """Context manager that borrows instance of the pooled ``key``
+        (see ``pools``), waits if all instances are in use.
+
+        Args:
+            key: pooled key
+            timeout: maximum seconds to wait, None to wait forever
+
+        Raises:
+            KeyError: if key is not pooled
+            TimeoutError: if no instance was released in time
+
+        """
+        pool = self.pools[key]
+        inst = pool.acquire(timeout)
+        try:
+            yield inst
+        finally:
+            pool.release(inst)
+
+    async def _abuild(self, key, graph, built):
+        inst = self._build(key, graph, built)
+        if inspect.isawaitable(inst):
+            start = time.perf_counter()
+            inst = await inst
+            if self.stats is not None:
+                args = [arg for arg in graph.params[key]
+                        if arg in self.data or arg in built]
+                self.stats.instantiated(
+                    key, time.perf_counter() - start, args)
+        return inst
+
+    async def _acache(self, key, graph, built):
+        """Awaits singleton instance of the key, which is built once
+        even if requested by concurrent tasks.
+        """
+        if key in self.data:
+            return self.data[key]
+        future = self._abuilding.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        # running loop of the coroutine (get_running_loop needs 3.7+)
+        future = self._abuilding[key] = (
+            asyncio.get_event_loop().create_future())
+        try:
+            inst = self._store(key, await self._abuild(key, graph, built))
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, if nobody else awaits it
+            raise
+        else:
+            future.set_result(inst)
+            if inst is not None and self.max_instances is not None:
+                self._evict_lru(key)
+            return inst
+        finally:
+            del self._abuilding[key]
+
+    async def aget(self, key):
+        """Returns driver instance, awaits it if the driver is
+        a coroutine function (or returns awaitable otherwise).
+
+        With ``autoinject``, independent dependencies are instantiated
+        concurrently, one dependency level at a time.
+
+        Returns:
+            driver instance or None, if no driver is set to serve this key
+
+        """
+        live = _Fresh(self) if self._born else self.data
+        if key in live:
+            return self.data[key]
+        if key not in self.pack:
+            return None
+        graph = self.graph
+        build = self._acache if self._singleton else self._abuild
+        built = {}
+        if self._autoinject:
+            for level in graph.levels([key], skip=live)[:-1]:
+                instances = await asyncio.gather(
+                    *(build(k, graph, built) for k in level))
+                built.update(zip(level, instances))
+        return await build(key, graph, built)
+
+    async def aclose(self):
+        """Deletes all instances, latest first, awaiting their ``aclose``
+        or ``close``, if it returns awaitable. Closes pooled instances.
+        """
+        for pool in self.pools.values():
+            pool.close()
+        for key in reversed(list(self.data)):
+            inst = self.data.pop(key, None)
+            self._born.pop(key, None)
+            if self.stats is not None and key in self._made:
+                self.stats.closed(key)
+            self._made.discard(key)
+            close = getattr(inst, 'aclose', None) or getattr(
+                inst, 'close', None)
+            if not callable(close):
+                continue
+            try:
+                result = close()
+            except TypeError:
+                continue
+            if inspect.isawaitable(result):
+                await result
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
 
     def cascade_delete(self, key):
         """Removes ``self[key]`` and all keys that have this key as argument.
 
+        Dependents are found with reverse edges of ``graph``, so time
+        is proportional to the number of dependents.
+
         Args:
             key: key to remove
 
@@ -129,12 +1007,7 @@ class DriverPack(collections.UserDict):
 
         """
         if key in self.data:
-            # remove everyone who depends on me
-            targets = set(self.data.keys()) - {key}
-            targets = targets.intersection(set(self.pack.keys()))
-            for target in targets:
-                sig = inspect.signature(self.pack.get(target))
-                if key in sig.parameters:
-                    self.cascade_delete(target)
-            del self[key]
+            # remove everyone who depends on me, then me
+            for target in self.graph.cascade(key, self.data):
+                del self[target]
         return self
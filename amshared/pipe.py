@@ -5,8 +5,19 @@ Functions should be designed the way that a result returned by
 preceding function (pipe argument) could be used as the first argument
 to the next function, and so on.
 
+For pipes called many times, ``compile`` fuses the steps
+into a single function once.
+
 """
 
+import keyword
+
+
+class _Step(tuple):
+    """Kind and arguments of a step made by this module, so that
+    ``compile`` can inline it.
+    """
+
 
 def run(*args, initial=None):
     """Creates and runs the pipe calling functions in given sequence.
@@ -38,7 +49,11 @@ def load(x):
         function that performs the required action in pipe
 
     """
-    return lambda _: x
+    def g(_):
+        return x
+
+    g._pipe_step = _Step(('load', x))
+    return g
 
 
 def tee(f, *args, **kwargs):
@@ -67,6 +82,7 @@ def tee(f, *args, **kwargs):
         f(*pargs, **kwargs)
         return x
 
+    g._pipe_step = _Step(('tee', f, args, kwargs))
     return g
 
 
@@ -89,6 +105,7 @@ def method(name, *args, **kwargs):
         f = getattr(x, name, None)
         return f(*args, **kwargs)
 
+    g._pipe_step = _Step(('method', name, args, kwargs))
     return g
 
 
@@ -113,6 +130,7 @@ def tee_method(name, *args, **kwargs):
         f(*args, **kwargs)
         return x
 
+    g._pipe_step = _Step(('tee_method', name, args, kwargs))
     return g
 
 
@@ -140,4 +158,85 @@ def call(f, *args, **kwargs):
         pargs = (x,) + args
         return f(*pargs, **kwargs)
 
+    g._pipe_step = _Step(('call', f, args, kwargs))
     return g
+
+
+def _arguments(namespace, prefix, args, kwargs):
+    """Returns source of call arguments, adds their values to namespace."""
+    sources = []
+    for i, value in enumerate(args):
+        namespace[f"{prefix}_a{i}"] = value
+        sources.append(f"{prefix}_a{i}")
+    names = {}
+    for key, value in kwargs.items():
+        if key.isidentifier() and not keyword.iskeyword(key):
+            namespace[f"{prefix}_k_{key}"] = value
+            sources.append(f"{key}={prefix}_k_{key}")
+        else:
+            names[key] = value
+    if names:
+        namespace[f"{prefix}_kw"] = names
+        sources.append(f"**{prefix}_kw")
+    return ', '.join(sources)
+
+
+def compile(*args):
+    """Creates reusable pipe: function of pipe argument that calls
+    functions in given sequence, like ``run``.
+
+    Steps are fused into one generated function: ``load``, ``call``,
+    ``tee``, ``method`` and ``tee_method`` are inlined with their
+    arguments, so a call costs no more than the calls it makes.
+
+    Note:
+        Missing method raises ``AttributeError`` rather than ``TypeError``.
+
+    Args:
+        *args: functions to call in sequence
+
+    Returns:
+        function of pipe argument (None by default)
+
+    """
+    namespace = {}
+    lines = ['def pipe(x=None):']
+    for n, fun in enumerate(args):
+        step = getattr(fun, '_pipe_step', None)
+        kind, *step = step if isinstance(step, _Step) else (None,)
+        prefix = f"s{n}"
+        if kind == 'load':
+            namespace[prefix] = step[0]
+            lines.append(f"    x = {prefix}")
+        elif kind in ('call', 'tee'):
+            f, fargs, fkwargs = step
+            namespace[prefix] = f
+            call_source = f"{prefix}(" + ', '.join(
+                filter(None, ['x', _arguments(namespace, prefix, fargs,
+                                              fkwargs)])) + ")"
+            if kind == 'call':
+                lines.append(f"    x = {call_source}")
+            else:
+                lines.append(f"    {call_source}")
+        elif kind in ('method', 'tee_method'):
+            name, margs, mkwargs = step
+            if name.isidentifier() and not keyword.iskeyword(name):
+                attribute = f"x.{name}"
+            else:
+                namespace[prefix] = name
+                attribute = f"getattr(x, {prefix})"
+            call_source = (f"{attribute}("
+                           f"{_arguments(namespace, prefix, margs, mkwargs)})")
+            if kind == 'method':
+                lines.append(f"    x = {call_source}")
+            else:
+                lines.append(f"    {call_source}")
+        else:
+            namespace[prefix] = fun
+            lines.append(f"    x = {prefix}(x)")
+    lines.append('    return x')
+    source = '\n'.join(lines) + '\n'
+    exec(source, namespace)
+    pipe = namespace['pipe']
+    pipe.source = source
+    return pipe
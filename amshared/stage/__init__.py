@@ -5,6 +5,8 @@ Data Flow is a sequence (list, generator) of (metadata, content) tuples.
 
 Metadata is a key-value dictionary with several key names reserved:
 ``rubric``, ``name``, ``part``, `format``, and ``payload``.
+Keys ``read_offset`` and ``read_length`` of load requests select a byte range
+of content, so they are reserved as well.
 
 Content is useful application data (payload) or miscellaneous information
 in arbitrary format.
@@ -19,3 +21,7 @@ Elements of data flows are logically organized in one of the three forms:
 """
 
 from .stagecore import Stage, Rubric, gen_dataflow
+from .backends import FileBackend, MemoryBackend, ArchiveBackend
+from .reaper import Reaper
+from .usage import QuotaExceeded
+from .sharded import ShardedStage
@@ -0,0 +1,477 @@
+"""
+Storage backends hold stage files: metadata, content and service logs.
+
+Backend is addressed with paths (``pathlib.PurePath``) and reads or writes
+content with format drivers, so that Stage operations are independent
+of where and how files are stored.
+
+:FileBackend: files in the filesystem (default)
+:MemoryBackend: files in a dictionary, content objects are kept as is
+:ArchiveBackend: read-only, files in zip or tar archive
+
+"""
+
+import io
+import locale
+import os
+import pathlib
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+
+_FICLONE = 0x40049409  # Linux ioctl request to clone (reflink) a file
+
+
+def reflink(src, dst):
+    """Clones file ``src`` as ``dst`` sharing data blocks copy-on-write.
+
+    Raises:
+        OSError: if not supported by OS or filesystem
+
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError('Reflinks are not supported')
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+
+
+def link_tree(src, dst, use_reflink=False):
+    """Recreates directory tree ``src`` as ``dst`` linking all files.
+
+    Files are reflinked if ``use_reflink`` is True and filesystem allows,
+    hardlinked otherwise, copied if linking fails (e.g. across devices).
+
+    Returns:
+        number of files linked
+
+    """
+    count = 0
+    for dirpath, _, filenames in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(dirpath, src))
+        os.makedirs(target, exist_ok=True)
+        for filename in filenames:
+            s = os.path.join(dirpath, filename)
+            d = os.path.join(target, filename)
+            try:
+                if use_reflink:
+                    try:
+                        reflink(s, d)
+                    except OSError:
+                        os.link(s, d)
+                else:
+                    os.link(s, d)
+            except OSError:
+                shutil.copy2(s, d)
+            count += 1
+    return count
+
+
+def copy_stream(src, dst):
+    """Copies binary file object ``src`` to ``dst`` from current positions.
+
+    If both are OS files, data is copied by kernel (``os.copy_file_range``
+    or ``os.sendfile``) without passing through Python.
+
+    Returns:
+        number of bytes copied
+
+    """
+    try:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        src_fd = dst_fd = None
+    if src_fd is not None:
+        dst.flush()
+        size = os.fstat(src_fd).st_size - src.tell()
+        for copy in ('copy_file_range', 'sendfile'):
+            if not hasattr(os, copy):
+                continue
+            copied = 0
+            try:
+                while copied < size:
+                    if copy == 'copy_file_range':
+                        n = os.copy_file_range(src_fd, dst_fd, size - copied)
+                    else:
+                        n = os.sendfile(dst_fd, src_fd, None, size - copied)
+                    if not n:
+                        break
+                    copied += n
+            except OSError:
+                if copied:
+                    raise
+                continue  # not supported for these files, try another way
+            # synchronize file objects with positions moved by kernel
+            # (pipes and sockets have none)
+            if dst.seekable():
+                dst.seek(os.lseek(dst_fd, 0, os.SEEK_CUR))
+            if src.seekable():
+                src.seek(os.lseek(src_fd, 0, os.SEEK_CUR))
+            return copied
+    copied = 0
+    for chunk in iter(lambda: src.read(1 << 20), b''):
+        dst.write(chunk)
+        copied += len(chunk)
+    return copied
+
+
+def break_link(path):
+    """Replaces file shared by hardlinks (e.g. with snapshot) with a copy."""
+    if os.stat(path).st_nlink > 1:
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, path)
+
+
+class FileBackend:
+    """Stores stage in the filesystem."""
+
+    def root(self, path):
+        """Returns path of the topmost stage folder, creating it."""
+        if isinstance(path, pathlib.Path):
+            topmost = path
+        else:
+            topmost = pathlib.Path(path)
+        if topmost.exists() and not topmost.is_dir():
+            raise FileNotFoundError(f"Not a directory: '{topmost}'")
+        topmost.mkdir(parents=True, exist_ok=True)
+        return topmost
+
+    def exists(self, path):
+        return path.exists()
+
+    def listdir(self, path):
+        """Returns list of (name, is_file) of folder entries."""
+        return [(p.name, p.is_file()) for p in path.glob('*')]
+
+    def makedirs(self, path):
+        path.mkdir(parents=True, exist_ok=True)
+
+    def read(self, driver, path):
+        return driver.read(path)
+
+    def read_range(self, driver, path, offset, length):
+        return driver.read_range(path, offset, length)
+
+    def write(self, driver, content, path):
+        """Writes content with driver, never changing existing files.
+
+        Content is written to a new file which then replaces the old one,
+        so files shared by hardlinks (e.g. with snapshot) or mapped
+        into memory (see ``Pickle5Driver``) keep the old content,
+        and readers never see a partially written file.
+
+        """
+        tmp_path = path.with_name(
+            f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            driver.write(content, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def unlink(self, path):
+        path.unlink()
+
+    def rmdir(self, path):
+        path.rmdir()
+
+    def stat(self, path):
+        """Returns (size, modification time) of a file."""
+        st = os.stat(path)
+        return st.st_size, st.st_mtime
+
+    def iter_files(self, top, suffix=''):
+        """Yields paths of all files under ``top`` with the given suffix."""
+        for dirpath, _, filenames in os.walk(top):
+            for filename in filenames:
+                if filename.endswith(suffix):
+                    yield pathlib.Path(dirpath, filename)
+
+    def append(self, path, data):
+        """Appends bytes to a file, creating it and its folder if needed."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            break_link(path)
+        with open(path, 'ab') as file:
+            file.write(data)
+
+    def read_from(self, path, offset=0):
+        """Returns bytes of a file starting at ``offset``."""
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            return file.read()
+
+    def copy_to(self, path, file):
+        """Copies raw file content to binary file object."""
+        with open(path, 'rb') as src:
+            return copy_stream(src, file)
+
+    def snapshot(self, src, dst, use_reflink=False):
+        return link_tree(src, dst, use_reflink=use_reflink)
+
+    def export(self, top, dest):
+        """Writes all files under ``top`` to zip or tar archive.
+
+        Archive type is chosen by ``dest`` suffix: ``.zip`` (not compressed,
+        so that members can be read with seek), ``.tar``, ``.tar.gz``,
+        ``.tar.bz2`` or ``.tar.xz``.
+
+        Returns:
+            number of files archived
+
+        """
+        name = str(dest)
+        paths = [path for path in self.iter_files(top)
+                 if not path.name.startswith('.')]
+        if name.endswith('.zip'):
+            with zipfile.ZipFile(dest, 'w') as archive:
+                for path in paths:
+                    archive.write(path, path.relative_to(top).as_posix())
+        else:
+            compression = name.rpartition('.tar')[2].lstrip('.')
+            if compression not in ('', 'gz', 'bz2', 'xz'):
+                raise ValueError(f"Unknown archive type: '{dest}'")
+            with tarfile.open(dest, f"w:{compression}") as archive:
+                for path in paths:
+                    archive.add(path, path.relative_to(top).as_posix())
+        return len(paths)
+
+
+def size_of(content):
+    """Estimates size of content object in bytes."""
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return len(content)
+    elif isinstance(content, str):
+        return len(content.encode('utf-8'))
+    else:
+        return sys.getsizeof(content)
+
+
+class MemoryBackend:
+    """Stores stage in memory.
+
+    Content objects are stored and returned as is, without serialization
+    (format drivers are not used, still format must be supported).
+    Do not change saved or loaded mutable content in place.
+    Metadata dictionaries are copied.
+
+    One backend may hold several stages (e.g. snapshots) under different paths.
+
+    """
+
+    def __init__(self):
+        self.files = {}  # path -> (content, modification time)
+        self.folders = {}  # path -> set of entry names
+        self.lock = threading.RLock()
+
+    def root(self, path):
+        topmost = pathlib.PurePosixPath(path)
+        if topmost in self.files:
+            raise FileNotFoundError(f"Not a directory: '{topmost}'")
+        self.makedirs(topmost)
+        return topmost
+
+    def exists(self, path):
+        return path in self.folders or path in self.files
+
+    def listdir(self, path):
+        with self.lock:
+            return [(name, path / name in self.files)
+                    for name in self.folders.get(path, ())]
+
+    def makedirs(self, path):
+        with self.lock:
+            while path not in self.folders:
+                if path in self.files:
+                    raise FileExistsError(f"File exists: '{path}'")
+                self.folders[path] = set()
+                if path.parent == path:
+                    break
+                self.folders.setdefault(path.parent, set()).add(path.name)
+                path = path.parent
+
+    def _content(self, path):
+        try:
+            return self.files[path][0]
+        except KeyError:
+            raise FileNotFoundError(f"No such file: '{path}'") from None
+
+    def read(self, driver, path):
+        content = self._content(path)
+        return dict(content) if isinstance(content, dict) else content
+
+    def copy_to(self, path, file):
+        """Writes text (encoded) or bytes content to binary file object."""
+        content = self._content(path)
+        if isinstance(content, str):
+            content = content.encode(locale.getpreferredencoding(False))
+        elif content is None:
+            content = b''
+        elif not isinstance(content, (bytes, bytearray, memoryview)):
+            raise NotImplementedError('Content is neither text nor bytes')
+        file.write(content)
+        return len(content)
+
+    def read_range(self, driver, path, offset, length):
+        content = self._content(path)
+        if isinstance(content, str):  # offsets are in bytes, as in files
+            data = content.encode(locale.getpreferredencoding(False))
+            return driver.load_range(io.BytesIO(data), offset, length)
+        if offset is None:
+            offset = 0
+        end = None if length is None else (offset + length) or None
+        return content[offset:end]
+
+    def write(self, driver, content, path):
+        if isinstance(content, dict):
+            content = dict(content)
+        with self.lock:
+            if path.parent not in self.folders:
+                raise FileNotFoundError(f"No such folder: '{path.parent}'")
+            self.files[path] = content, time.time()
+            self.folders[path.parent].add(path.name)
+
+    def unlink(self, path):
+        with self.lock:
+            if path not in self.files:
+                raise FileNotFoundError(f"No such file: '{path}'")
+            del self.files[path]
+            self.folders[path.parent].discard(path.name)
+
+    def rmdir(self, path):
+        with self.lock:
+            if self.folders.get(path):
+                raise OSError(f"Folder not empty: '{path}'")
+            self.folders.pop(path, None)
+            self.folders.get(path.parent, set()).discard(path.name)
+
+    def stat(self, path):
+        content, mtime = self.files.get(path, (None, None))
+        if mtime is None:
+            raise FileNotFoundError(f"No such file: '{path}'")
+        return size_of(content), mtime
+
+    def iter_files(self, top, suffix=''):
+        with self.lock:
+            paths = [path for path in self.files
+                     if top in path.parents and path.name.endswith(suffix)]
+        yield from paths
+
+    def append(self, path, data):
+        with self.lock:
+            self.makedirs(path.parent)
+            content, _ = self.files.get(path, (b'', None))
+            self.write(None, content + data, path)
+
+    def read_from(self, path, offset=0):
+        return self._content(path)[offset:]
+
+    def snapshot(self, src, dst, use_reflink=False):
+        with self.lock:
+            paths = [path for path in self.files if src in path.parents]
+            for path in paths:
+                target = dst / path.relative_to(src)
+                self.makedirs(target.parent)
+                self.files[target] = self.files[path]
+                self.folders[target.parent].add(target.name)
+        return len(paths)
+
+
+class ArchiveBackend(MemoryBackend):
+    """Serves stage from zip or tar archive, read-only, without extraction.
+
+    Archive is opened by ``root`` (i.e. path of the stage is the path
+    of the archive), its member index is kept in memory,
+    so reading a file seeks straight to the member.
+    Members of uncompressed tar and stored (not compressed) zip members
+    are read without decompressing preceding data.
+
+    Content is read with driver's ``load`` method from member file object,
+    or extracted to a temporary file for drivers without one.
+    Any change raises ``PermissionError``.
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.archive = None
+        self._open = None
+
+    def root(self, path):
+        if self.archive is not None:
+            self.read_only()
+        topmost = pathlib.PurePosixPath(path)
+        if zipfile.is_zipfile(path):
+            self.archive = zipfile.ZipFile(path)
+            self._open = self.archive.open
+            members = (
+                (info.filename, info, time.mktime(info.date_time + (0, 0, -1)))
+                for info in self.archive.infolist() if not info.is_dir()
+            )
+        else:
+            self.archive = tarfile.open(path)
+            self._open = self.archive.extractfile
+            members = (
+                (info.name, info, info.mtime)
+                for info in self.archive.getmembers() if info.isfile()
+            )
+        super().makedirs(topmost)
+        for name, info, mtime in members:
+            path = topmost / name
+            super().makedirs(path.parent)
+            self.files[path] = info, mtime
+            self.folders[path.parent].add(path.name)
+        return topmost
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+    def read_only(self, *args, **kwargs):
+        raise PermissionError('Archive is read-only')
+
+    makedirs = write = unlink = rmdir = append = snapshot = read_only
+
+    def read(self, driver, path):
+        info = self._content(path)
+        with self.lock, self._open(info) as file:
+            if hasattr(driver, 'load'):
+                return driver.load(file)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                tmp_path = pathlib.Path(tmp_dir, path.name)
+                with open(tmp_path, 'wb') as tmp_file:
+                    shutil.copyfileobj(file, tmp_file)
+                return driver.read(tmp_path)
+
+    def read_range(self, driver, path, offset, length):
+        if not hasattr(driver, 'load_range'):
+            raise NotImplementedError
+        info = self._content(path)
+        with self.lock, self._open(info) as file:
+            return driver.load_range(file, offset, length)
+
+    def copy_to(self, path, file):
+        with self.lock, self._open(self._content(path)) as src:
+            return copy_stream(src, file)
+
+    def stat(self, path):
+        info = self._content(path)
+        size = getattr(info, 'file_size', None)
+        return info.size if size is None else size, self.files[path][1]
+
+    def read_from(self, path, offset=0):
+        with self.lock, self._open(self._content(path)) as file:
+            file.seek(offset)
+            return file.read()
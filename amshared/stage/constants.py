@@ -1,5 +1,6 @@
 STAGE_CONTENT = 'content'  # name for content top folder
 STAGE_METADATA = 'metadata'  # name for metadata top folder
+STAGE_INDEX = 'index'  # name for secondary indexes top folder
 STAGE_HEAP = '__heap__'  # name for folder containing unrelated data parts
 STAGE_WILD = '*'  # wildcard for 'all parts'
 STAGE_RUBRIC_EMPTY = '.'  # directory if rubric metadata is empty
@@ -12,3 +13,7 @@ MK_NAME = 'name'
 MK_PART = 'part'
 MK_FORMAT = 'format'
 MK_ERROR = 'error'
+MK_TTL = 'ttl'  # time to live, in seconds since save
+MK_EXPIRES = 'expires'  # expiration time, in seconds since the epoch
+MK_OFFSET = 'read_offset'  # partial read: first byte to read
+MK_LENGTH = 'read_length'  # partial read: number of bytes to read
@@ -0,0 +1,63 @@
+"""
+Adapters between pandas DataFrames and stage dataflows.
+
+DataFrame is saved as multipart content: one part per group of rows
+(or per chunk of rows), with group key stored in part metadata.
+Loading reads all (or selected) parts and joins them with a single concat.
+
+Note:
+    pandas is imported on demand and is not required by other stage modules.
+
+"""
+
+import pickle
+from .constants import MK_RUBRIC, MK_NAME, MK_PART, MK_FORMAT
+
+FRAME_GROUP = 'group'  # metadata key for the key of a group of rows
+# default format of parts, pickle5 needs Python 3.8+
+FRAME_FORMAT = 'pickle5' if pickle.HIGHEST_PROTOCOL >= 5 else 'pickle'
+
+
+def gen_frame_dataflow(df, rubric, name, by=None, chunk_size=None,
+                       fmt=FRAME_FORMAT):
+    """Generates dataflow of DataFrame parts.
+
+    Args:
+        df: pandas DataFrame
+        rubric: rubric to save to
+        name: name of multipart content
+        by: column name(s) or other ``DataFrame.groupby`` argument
+            to split rows into parts
+        chunk_size: maximum number of rows per part, if ``by`` is None;
+            if also None, DataFrame is saved as single part
+        fmt: format of parts
+
+    Yields:
+        (metadata, DataFrame) tuples
+
+    """
+    meta = {MK_RUBRIC: rubric, MK_NAME: name, MK_PART: True, MK_FORMAT: fmt}
+    if by is not None:
+        for key, group in df.groupby(by, sort=False, dropna=False):
+            if isinstance(key, tuple):
+                key = list(key)
+            yield {**meta, FRAME_GROUP: key}, group
+    elif chunk_size:
+        for start in range(0, len(df), chunk_size):
+            yield meta, df.iloc[start:start + chunk_size]
+    else:
+        yield meta, df
+
+
+def concat_frames(frames, **kwargs):
+    """Joins DataFrames with single ``pandas.concat`` call.
+
+    Returns:
+        DataFrame or None, if there is nothing to join
+
+    """
+    import pandas as pd
+    frames = list(frames)
+    if not frames:
+        return None
+    return pd.concat(frames, **kwargs)
@@ -0,0 +1,207 @@
+"""
+Secondary indexes on custom metadata keys.
+
+Index of a key is an append-only log (JSON Lines file) of
+``[rubric, name, part, value]`` records, where ``value`` is the metadata value
+under this key, and ``[rubric, name, part]`` records for objects that were
+deleted (or lost the key).
+Log is replayed into memory on first use and then only its new records are
+read, so changes made by other Stage instances are picked up cheaply.
+
+"""
+
+import operator
+import threading
+from . import jsoncodec
+from .constants import (
+    STAGE_INDEX, STAGE_META_FORMAT, STAGE_META_SFX, STAGE_WILD,
+    MK_PAYLOAD, MK_RUBRIC, MK_NAME, MK_PART
+)
+
+_ops = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, options: value in options
+}
+
+
+def parse_condition(condition):
+    """Converts ``value`` or ``(op, value)`` condition to predicate."""
+    if (
+            isinstance(condition, tuple) and
+            len(condition) == 2 and
+            condition[0] in _ops
+    ):
+        op, reference = _ops[condition[0]], condition[1]
+    else:
+        op, reference = operator.eq, condition
+
+    def predicate(value):
+        try:
+            return bool(op(value, reference))
+        except TypeError:  # uncomparable types do not match
+            return False
+
+    return predicate
+
+
+def object_id(meta):
+    """Identifies stage object by its metadata."""
+    part = meta.get(MK_PART)
+    if part == STAGE_WILD:
+        part = None
+    return meta[MK_RUBRIC], meta[MK_NAME], part
+
+
+def id_request(oid):
+    """Returns metadata to request object by its id."""
+    return dict(zip((MK_RUBRIC, MK_NAME, MK_PART), oid))
+
+
+def iter_meta(stg, top):
+    """Yields (path, metadata) of all metadata files under ``top`` folder."""
+    backend = stg.backend
+    meta_driver = stg.iodp[STAGE_META_FORMAT]
+    for path in backend.iter_files(top, STAGE_META_SFX):
+        try:
+            yield path, backend.read(meta_driver, path)
+        except FileNotFoundError:  # deleted meanwhile
+            continue
+        except ValueError:  # being written, can not be decoded yet
+            continue
+
+
+def append_records(backend, path, records):
+    """Appends records to JSON Lines log."""
+    data = b''.join(jsoncodec.dumps(record) + b'\n' for record in records)
+    backend.append(path, data)
+
+
+def read_records(backend, path, offset=0):
+    """Yields (record, offset after record) of complete log records
+    starting at ``offset``.
+    """
+    for line in backend.read_from(path, offset).splitlines(keepends=True):
+        if not line.endswith(b'\n'):
+            break  # incomplete record is being written
+        offset += len(line)
+        yield jsoncodec.loads(line), offset
+
+
+class MetaIndex:
+    """Secondary indexes for the given metadata keys of a stage.
+
+    Args:
+        stg: Stage instance
+        keys: metadata keys to index
+
+    """
+
+    def __init__(self, stg, keys):
+        self.stg = stg
+        self.keys = tuple(keys)
+        self.path = stg.topmost / STAGE_INDEX
+        self._entries = {key: {} for key in self.keys}
+        self._offsets = {key: 0 for key in self.keys}
+        self._in_memory = False  # logs can not be written
+        self.lock = threading.RLock()  # shared with reaper, writer threads
+
+    def log_path(self, key):
+        return self.path / f"{key}.jsonl"
+
+    def sync(self):
+        """Reads log records appended since last call, builds missing logs."""
+        with self.lock:
+            self._sync()
+
+    def _sync(self):
+        backend = self.stg.backend
+        if not self._in_memory and not all(
+                backend.exists(self.log_path(key)) for key in self.keys):
+            self.rebuild()
+        if self._in_memory:
+            return
+        for key in self.keys:
+            entries = self._entries[key]
+            path, offset = self.log_path(key), self._offsets[key]
+            for record, offset in read_records(backend, path, offset):
+                oid = tuple(record[:3])
+                if len(record) > 3:
+                    entries[oid] = record[3]
+                else:
+                    entries.pop(oid, None)
+            self._offsets[key] = offset
+
+    def rebuild(self):
+        """Builds indexes from scratch scanning all metadata files.
+
+        Indexes of read-only stages (e.g. served from archive) are kept
+        in memory only.
+
+        """
+        backend = self.stg.backend
+        records = {key: [] for key in self.keys}
+        for _, meta in iter_meta(self.stg, self.stg.topmetadata):
+            for key in self.keys:
+                if key in meta:
+                    records[key].append([*object_id(meta), meta[key]])
+        try:
+            for key in self.keys:
+                if backend.exists(self.log_path(key)):
+                    backend.unlink(self.log_path(key))
+                append_records(backend, self.log_path(key), records[key])
+                self._entries[key] = {}
+                self._offsets[key] = 0
+        except PermissionError:
+            self._in_memory = True
+            for key in self.keys:
+                self._entries[key] = {
+                    tuple(record[:3]): record[3] for record in records[key]
+                }
+
+    def update(self, dataflow, removed=False):
+        """Records saved (or ``removed``) objects, yields dataflow unchanged.
+
+        Records are appended to logs when dataflow ends or is abandoned,
+        missing logs are built first, so that objects saved before
+        indexing are not lost.
+
+        """
+        records = {key: [] for key in self.keys}
+        try:
+            for metadata, content in dataflow:
+                if metadata.get(MK_PAYLOAD, True):
+                    oid = [*object_id(metadata)]
+                    for key in self.keys:
+                        if removed or key not in metadata:
+                            records[key].append(oid)
+                        else:
+                            records[key].append(oid + [metadata[key]])
+                yield metadata, content
+        finally:
+            if any(records.values()):
+                with self.lock:
+                    self._sync()
+                    for key in self.keys:
+                        append_records(self.stg.backend, self.log_path(key),
+                                       records[key])
+
+    def select(self, where):
+        """Returns ids of objects matching all ``where`` conditions
+        on indexed keys.
+        """
+        selected = None
+        with self.lock:
+            self._sync()
+            for key, condition in where.items():
+                predicate = parse_condition(condition)
+                matches = {
+                    oid for oid, value in self._entries[key].items()
+                    if predicate(value)
+                }
+                selected = matches if selected is None else selected & matches
+        return selected
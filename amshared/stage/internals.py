@@ -1,22 +1,46 @@
 import pathlib
+import time
 from ..helpers import safe_numeric
 from .metadata import MetaData
 from .constants import (
-    STAGE_META_FORMAT, STAGE_HEAP,
-    STAGE_META_SFX, MK_RUBRIC, MK_NAME, MK_PART, MK_FORMAT
+    STAGE_META_FORMAT, STAGE_HEAP, STAGE_WILD, STAGE_META_SFX,
+    MK_PAYLOAD, MK_RUBRIC, MK_NAME, MK_PART, MK_FORMAT, MK_ERROR,
+    MK_OFFSET, MK_LENGTH, MK_TTL, MK_EXPIRES
 )
 
 
+def stamp_expiry(meta, now=None):
+    """Sets expiration time of the object if metadata has time to live."""
+    ttl = meta.get(MK_TTL)
+    if ttl is not None:
+        meta[MK_EXPIRES] = (time.time() if now is None else now) + ttl
+
+
+def account(backend, mfile, cfile):
+    """Returns total size of object files and 1 if object exists, else 0."""
+    try:
+        nbytes, exists = backend.stat(mfile)[0], 1
+    except FileNotFoundError:
+        nbytes, exists = 0, 0
+    try:
+        nbytes += backend.stat(cfile)[0]
+    except FileNotFoundError:
+        pass
+    return nbytes, exists
+
+
 class StageFolder:
     """Base class for a folder-inside-stage object.
 
     Args:
-        path (pathlib.Path): path of the corresponding filesystem folder
+        path (pathlib.PurePath): path of the corresponding folder
+        backend: storage backend, see ``backends``
 
     """
 
-    def __init__(self, path):
+    def __init__(self, path, backend):
         self.path = path
+        self.backend = backend
 
     def __truediv__(self, subpath):
         return self.path / subpath
@@ -29,7 +53,8 @@ class StageFolder:
         in a separate file.
 
         Note:
-            name of Heap is not included in return value
+            name of Heap and hidden (temporary) names are not included
+            in return value
 
         Args:
             files_only: names of files (True), dirs (False) or both (None)
@@ -38,18 +63,23 @@ class StageFolder:
             list of names
 
         """
-        pg = self.path.glob('*')
         if files_only is None:
             return self.lsnames(True) + self.lsnames(False)
-        elif files_only:
-            return [p.stem for p in pg if p.is_file()]
+        entries = [(name, is_file)
+                   for name, is_file in self.backend.listdir(self.path)
+                   if not name.startswith('.')]
+        if files_only:
+            return [pathlib.PurePath(name).stem
+                    for name, is_file in entries if is_file]
         else:
-            return [p.name for p in pg if p.is_dir() and p.name != STAGE_HEAP]
+            return [name for name, is_file in entries
+                    if not is_file and name != STAGE_HEAP]
 
     @property
     def parts(self):
-        """Returns list of all part **numbers** in folder."""
-        return [safe_numeric(stem, 0) for stem in self.lsnames(files_only=True)]
+        """Returns sorted list of all part **numbers** in folder."""
+        return sorted(safe_numeric(stem, 0)
+                      for stem in self.lsnames(files_only=True))
 
 
 class PairOps:
@@ -61,10 +91,12 @@ class PairOps:
         self.meta = meta.copy()
         self.content = content
         self.read_meta_only = content is False
+        self.span = self.meta.get(MK_OFFSET), self.meta.get(MK_LENGTH)
         self.set_paths()
 
     def set_paths(self):
-        self.rdir = StageFolder(self.stg.topmetadata / self.meta[MK_RUBRIC])
+        self.rdir = StageFolder(self.stg.topmetadata / self.meta[MK_RUBRIC],
+                                self.stg.backend)
         self.mdir = None
         self.mfile = None
         self.cdir = None
@@ -76,7 +108,8 @@ class PairOps:
                 and self.meta[MK_FORMAT] in self.stg.iodp.pack)
 
     def read_meta(self):
-        metadata = self.stg.iodp[STAGE_META_FORMAT].read(self.mfile)
+        metadata = self.stg.backend.read(self.stg.iodp[STAGE_META_FORMAT],
+                                         self.mfile)
         self.meta = MetaData(metadata)
         self.set_paths()
 
@@ -84,31 +117,65 @@ class PairOps:
         self.read_meta()
         if not self.format_is_supported:
             raise NotImplementedError
-        if not self.read_meta_only:
-            content = self.stg.iodp[self.meta[MK_FORMAT]].read(self.cfile)
-        else:
+        if self.read_meta_only:
             content = None
+        elif self.span == (None, None):
+            driver = self.stg.iodp[self.meta[MK_FORMAT]]
+            content = self.stg.backend.read(driver, self.cfile)
+        else:
+            content = self.read_range()
         return self.meta.data, content
 
+    def read_range(self):
+        driver = self.stg.iodp[self.meta[MK_FORMAT]]
+        if not hasattr(driver, 'read_range'):
+            raise NotImplementedError
+        for key, value in zip((MK_OFFSET, MK_LENGTH), self.span):
+            if value is not None:
+                self.meta[key] = value
+        return self.stg.backend.read_range(driver, self.cfile, *self.span)
+
+    def locate(self):
+        """Returns metadata and path of content file instead of content."""
+        self.read_meta()
+        if not self.format_is_supported:
+            raise NotImplementedError
+        return self.meta.data, self.cfile
+
     def write(self):
         if not self.format_is_supported:
             raise NotImplementedError
-        self.mfile.parent.mkdir(parents=True, exist_ok=True)
-        self.cfile.parent.mkdir(parents=True, exist_ok=True)
+        backend = self.stg.backend
+        backend.makedirs(self.mfile.parent)
+        backend.makedirs(self.cfile.parent)
+        acct = self.stg.accounting
+        if acct is not None:
+            acct.check(self.meta[MK_RUBRIC])
+            nbytes, exists = account(backend, self.mfile, self.cfile)
         content_driver = self.stg.iodp[self.meta[MK_FORMAT]]
-        content_driver.write(self.content, self.cfile)
+        stamp_expiry(self.meta)
+        backend.write(content_driver, self.content, self.cfile)
         metadata_driver = self.stg.iodp[STAGE_META_FORMAT]
-        metadata_driver.write(self.meta.data, self.mfile)
+        backend.write(metadata_driver, self.meta.data, self.mfile)
+        if acct is not None:
+            new_nbytes, _ = account(backend, self.mfile, self.cfile)
+            acct.change(self.meta[MK_RUBRIC], new_nbytes - nbytes, 1 - exists)
         return self.meta.data, None
 
     def unlink(self):
         self.read_meta()
-        self.mfile.unlink()
-        self.cfile.unlink()
+        backend = self.stg.backend
+        acct = self.stg.accounting
+        if acct is not None:
+            nbytes, _ = account(backend, self.mfile, self.cfile)
+        backend.unlink(self.mfile)
+        backend.unlink(self.cfile)
         report = self.meta.data, None  # OSError propagated
+        if acct is not None:
+            acct.change(self.meta[MK_RUBRIC], -nbytes, -1)
         try:
-            self.mfile.parent.rmdir()
-            self.cfile.parent.rmdir()
+            backend.rmdir(self.mfile.parent)
+            backend.rmdir(self.cfile.parent)
         except OSError:  # OSError is normal and not propagated
             pass
         return report
@@ -119,17 +186,20 @@ class AtomicOps(PairOps):
         super().set_paths()
         self.mdir = self.rdir
         self.mfile = self.mdir / f"{self.meta[MK_NAME]}{STAGE_META_SFX}"
-        self.cdir = StageFolder(self.stg.topcontent / self.meta[MK_RUBRIC])
+        self.cdir = StageFolder(self.stg.topcontent / self.meta[MK_RUBRIC],
+                                self.stg.backend)
         self.cfile = self.cdir / f"{self.meta[MK_NAME]}{self.meta.sfx}"
 
 
 class PartOps(PairOps):
     def set_paths(self):
         super().set_paths()
-        self.mdir = StageFolder(self.rdir / self.meta[MK_NAME])
+        self.mdir = StageFolder(self.rdir / self.meta[MK_NAME],
+                                self.stg.backend)
         self.cdir = StageFolder(self.stg.topcontent /
                                 self.meta[MK_RUBRIC] /
-                                self.meta[MK_NAME])
+                                self.meta[MK_NAME],
+                                self.stg.backend)
         if MK_PART in self.meta:
             self.mfile = self.mdir / f"{self.meta[MK_PART]}{STAGE_META_SFX}"
             self.cfile = self.cdir / f"{self.meta[MK_PART]}{self.meta.sfx}"
@@ -139,3 +209,96 @@ class PartOps(PairOps):
         self.meta[MK_PART] = max_part_num + 1
         self.set_paths()
         return self.write()
+
+
+class BatchOps:
+    """Writes a batch of dataflow pieces sharing the same rubric and name.
+
+    Directories are created once per batch, drivers are looked up once
+    per format and part numbers are allocated for the whole batch at once.
+
+    Args:
+        stg: Stage instance
+        meta: MetaData of any batch item (rubric, name and atomicity are used)
+
+    """
+
+    def __init__(self, stg, meta):
+        self.stg = stg
+        self.is_atomic = meta.is_atomic
+        rubric, name = meta[MK_RUBRIC], meta[MK_NAME]
+        self.backend = stg.backend
+        self.mdir = StageFolder(self.stg.topmetadata / rubric, self.backend)
+        self.cdir = StageFolder(self.stg.topcontent / rubric, self.backend)
+        if not self.is_atomic:
+            self.mdir = StageFolder(self.mdir / name, self.backend)
+            self.cdir = StageFolder(self.cdir / name, self.backend)
+        self._drivers = {}
+
+    def driver(self, fmt):
+        if fmt not in self._drivers:
+            self._drivers[fmt] = self.stg.iodp[fmt]
+        return self._drivers[fmt]
+
+    def allocate(self, metas):
+        """Assigns part numbers to the metadata lacking one, in order.
+
+        Numbering continues from the highest part number found either in the
+        folder or among explicitly numbered parts preceding in the batch,
+        exactly as a sequence of ``PartOps.append`` calls would do.
+
+        """
+        last = 0
+        if self.backend.exists(self.mdir.path):
+            last = max(self.mdir.parts, default=0)
+        for meta in metas:
+            part = meta.get(MK_PART)
+            if part is None or part == STAGE_WILD:
+                last += 1
+                meta[MK_PART] = last
+            else:
+                last = max(last, safe_numeric(part, 0))
+
+    def write(self, items):
+        """Writes (meta, content) items, yields resulting dataflow.
+
+        Errors are reported per item, see ``stagecore.call_method``.
+
+        """
+        if not self.is_atomic:
+            self.allocate(meta for meta, _ in items)
+        self.backend.makedirs(self.mdir.path)
+        self.backend.makedirs(self.cdir.path)
+        stem_key = MK_NAME if self.is_atomic else MK_PART
+        meta_driver = self.driver(STAGE_META_FORMAT)
+        acct = self.stg.accounting
+        now = time.time()
+        for meta, content in items:
+            stamp_expiry(meta, now)
+            stem = meta[stem_key]
+            try:
+                if meta[MK_FORMAT] not in self.stg.iodp.pack:
+                    raise NotImplementedError
+                mfile = self.mdir / f"{stem}{STAGE_META_SFX}"
+                cfile = self.cdir / f"{stem}{meta.sfx}"
+                if acct is not None:
+                    acct.check(meta[MK_RUBRIC])
+                    nbytes, exists = account(self.backend, mfile, cfile)
+                self.backend.write(self.driver(meta[MK_FORMAT]), content,
+                                   cfile)
+                self.backend.write(meta_driver, meta.data, mfile)
+                if acct is not None:
+                    new_nbytes, _ = account(self.backend, mfile, cfile)
+                    acct.change(meta[MK_RUBRIC], new_nbytes - nbytes,
+                                1 - exists)
+                yield meta.data, None
+            except (OSError, NotImplementedError) as e:
+                yield error_dataflow(meta, e)
+
+
+def error_dataflow(meta, e):
+    """Returns informational dataflow piece describing exception ``e``."""
+    ometa = meta.copy()
+    ometa[MK_PAYLOAD] = False
+    ometa[MK_ERROR] = type(e).__name__
+    return ometa.data, None
@@ -1,11 +1,44 @@
 """
 Ready-to-use "driver pack" wrappers to write-read text, json and binary
-(pickle) content.
+(raw bytes, pickle) content.
+
+Drivers that implement ``read_range(path, offset, length)`` support partial
+reads, see ``Stage.gload``.
+
+Drivers that implement ``load(file)`` and, optionally,
+``load_range(file, offset, length)`` can read content from binary file
+objects, e.g. members of archives, see ``backends.ArchiveBackend``.
 """
 
+import io
+import locale
+import mmap
 import pickle
-import json
-from ..islike import like_int, like_float, is_gen, is_array
+import struct
+from . import jsoncodec
+# StageEncoder used to be defined here, re-exported for compatibility
+from .jsoncodec import StageEncoder  # noqa: F401
+
+
+def seek_read(file, offset=None, length=None):
+    """Reads ``length`` bytes starting at ``offset`` without reading the rest.
+
+    Negative ``offset`` counts from the end of file.
+    If ``length`` is None, reads until the end of file.
+
+    Args:
+        file: binary file object
+
+    """
+    if offset:
+        file.seek(offset, io.SEEK_END if offset < 0 else io.SEEK_SET)
+    return file.read(-1 if length is None else length)
+
+
+def read_bytes(path, offset=None, length=None):
+    """Reads bytes of a file, see ``seek_read``."""
+    with open(path, 'rb') as file:
+        return seek_read(file, offset, length)
 
 
 class TextDriver:
@@ -14,6 +47,23 @@ class TextDriver:
             content = file.read()
         return content
 
+    def read_range(self, path, offset=None, length=None):
+        """Offset and length are in bytes, characters cut at edges are lost.
+        """
+        with open(path, 'rb') as file:
+            return self.load_range(file, offset, length)
+
+    def load(self, file):
+        encoding = locale.getpreferredencoding(False)
+        text = io.TextIOWrapper(file, encoding=encoding)
+        content = text.read()
+        text.detach()  # leave file open
+        return content
+
+    def load_range(self, file, offset=None, length=None):
+        data = seek_read(file, offset, length)
+        return data.decode(locale.getpreferredencoding(False), errors='ignore')
+
     def write(self, content, path):
         if content is None:
             content = ''
@@ -21,50 +71,166 @@ class TextDriver:
             file.write(content)
 
 
+class BinaryDriver:
+    def read(self, path):
+        with open(path, 'rb') as file:
+            content = file.read()
+        return content
+
+    def read_range(self, path, offset=None, length=None):
+        return read_bytes(path, offset, length)
+
+    def load(self, file):
+        return file.read()
+
+    def load_range(self, file, offset=None, length=None):
+        return seek_read(file, offset, length)
+
+    def write(self, content, path):
+        if content is None:
+            content = b''
+        with open(path, 'wb') as file:
+            file.write(content)
+
+
 class PickleDriver:
     def read(self, path):
         with open(path, 'rb') as file:
             content = pickle.load(file)
         return content
 
+    def load(self, file):
+        return pickle.load(file)
+
     def write(self, content, path):
         with open(path, 'wb') as file:
             pickle.dump(content, file)
 
 
-class StageEncoder(json.JSONEncoder):
-    """JSON Encoder helps json survive exotic data types, e.g. numpy."""
-    def default(self, x):
-        if like_int(x):
-            return int(x)
-        elif like_float(x):
-            return float(x)
-        elif is_gen(x):
-            return list(x)
-        elif is_array(x):
-            return list(x)
-        else:
+class Pickle5Driver:
+    """Pickle protocol 5 with large buffers stored out-of-band.
+
+    Requires Python 3.8+, registered as ``'pickle5'`` format there.
+
+    Buffers (e.g. of numpy arrays or pandas DataFrames) larger than
+    ``min_oob_size`` bytes are not copied into the pickle stream but
+    written after it, aligned, in the same file.
+    On read, the file is memory-mapped and the buffers are handed
+    to unpickler without copying.
+
+    File layout: magic, pickle stream length, number of buffers,
+    (offset, length) of every buffer, pickle stream, buffers.
+
+    """
+    magic = b'AMPKL5\0\0'
+    min_oob_size = 64 * 1024
+    alignment = 64
+
+    def _unpack(self, view):
+        """Unpickles content from memoryview of the whole file."""
+        start = len(self.magic) + 16
+        if view[:len(self.magic)] != self.magic:
+            raise pickle.UnpicklingError('Not a pickle5 file')
+        size, nbuf = struct.unpack_from('<QQ', view, len(self.magic))
+        index = struct.unpack_from(f'<{2 * nbuf}Q', view, start)
+        start += 16 * nbuf
+        buffers = [view[index[i]:index[i] + index[i + 1]]
+                   for i in range(0, len(index), 2)]
+        return pickle.loads(view[start:start + size], buffers=buffers)
+
+    def read(self, path):
+        with open(path, 'rb') as file:
             try:
-                return super().default(x)
-            except TypeError:
-                return None
+                # Copy-on-write mapping: buffers are writable,
+                # file is not changed
+                mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+            except ValueError:  # empty file
+                raise pickle.UnpicklingError(f"Empty file: '{path}'")
+        return self._unpack(memoryview(mm))
+
+    def load(self, file):
+        return self._unpack(memoryview(bytearray(file.read())))
+
+    def write(self, content, path):
+        buffers = []
+
+        def oob(buf):
+            raw = buf.raw()
+            if raw.nbytes < self.min_oob_size:
+                return True  # serialize in-band
+            buffers.append(raw)
+            return False
+
+        data = pickle.dumps(content, protocol=5, buffer_callback=oob)
+        offset = len(self.magic) + 16 + 16 * len(buffers) + len(data)
+        index = []
+        for raw in buffers:
+            offset += -offset % self.alignment
+            index.extend((offset, raw.nbytes))
+            offset += raw.nbytes
+        with open(path, 'wb') as file:
+            file.write(self.magic)
+            file.write(struct.pack(f'<QQ{len(index)}Q',
+                                   len(data), len(buffers), *index))
+            file.write(data)
+            for raw, buf_offset in zip(buffers, index[::2]):
+                file.write(b'\0' * (buf_offset - file.tell()))
+                file.write(raw)
 
 
 class JsonDriver:
     def read(self, path):
-        with open(path, 'r', encoding='utf-8') as file:
-            content = json.load(file)
+        with open(path, 'rb') as file:
+            content = self.load(file)
         return content
 
+    def load(self, file):
+        return jsoncodec.loads(file.read())
+
     def write(self, content, path):
-        with open(path, 'w', encoding='utf-8') as file:
-            json.dump(content, file, cls=StageEncoder, ensure_ascii=False)
+        with open(path, 'wb') as file:
+            file.write(jsoncodec.dumps(content))
+
+
+class JsonLinesDriver:
+    """JSON Lines: content is a sequence of records, one JSON per line.
+
+    Records are streamed: ``write`` accepts any iterable (e.g. generator),
+    ``iread`` yields records one by one.
+
+    """
+    def iread(self, path):
+        with open(path, 'rb') as file:
+            yield from self.iload(file)
+
+    def iload(self, file):
+        for line in file:
+            if line.strip():
+                yield jsoncodec.loads(line)
+
+    def read(self, path):
+        return [*self.iread(path)]
+
+    def load(self, file):
+        return [*self.iload(file)]
+
+    def write(self, content, path):
+        if content is None:
+            content = ()
+        with open(path, 'wb') as file:
+            for record in content:
+                file.write(jsoncodec.dumps(record))
+                file.write(b'\n')
 
 
 _default_io_pack = {
     '': PickleDriver,
     'pickle': PickleDriver,
+    'bin': BinaryDriver,
     'txt': TextDriver,
     'html': TextDriver,
-    'json': JsonDriver
+    'json': JsonDriver,
+    'jsonl': JsonLinesDriver
 }
+if pickle.HIGHEST_PROTOCOL >= 5:  # Python 3.8+
+    _default_io_pack['pickle5'] = Pickle5Driver
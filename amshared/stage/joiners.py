@@ -0,0 +1,57 @@
+"""
+Joiners for ``Stage.payload``: combine content of multiple parts
+as it is loaded, one part at a time, without collecting all parts in a list.
+
+For joining raw content files, without loading content at all,
+see ``Stage.copy_payload``.
+"""
+
+import tempfile
+
+
+def into(file):
+    """Creates joiner that writes content of each part to ``file``.
+
+    Content should match file mode: text (str) or binary (bytes).
+
+    Args:
+        file: file object
+
+    Returns:
+        joiner that returns ``file``
+
+    """
+
+    def joiner(contents):
+        for content in contents:
+            if content is not None:
+                file.write(content)
+        return file
+
+    return joiner
+
+
+def spooled(max_size=1 << 20, encoding='utf-8'):
+    """Creates joiner that concatenates parts into binary file object.
+
+    Content is kept in memory until it exceeds ``max_size`` bytes,
+    then it is rolled over to temporary file on disk.
+    Text parts are encoded.
+
+    Returns:
+        joiner that returns ``tempfile.SpooledTemporaryFile``
+        positioned at the beginning
+
+    """
+
+    def joiner(contents):
+        file = tempfile.SpooledTemporaryFile(max_size=max_size)
+        for content in contents:
+            if isinstance(content, str):
+                content = content.encode(encoding)
+            if content is not None:
+                file.write(content)
+        file.seek(0)
+        return file
+
+    return joiner
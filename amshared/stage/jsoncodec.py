@@ -0,0 +1,121 @@
+"""
+JSON codec that survives exotic data types, e.g. numpy.
+
+Values that ``json`` cannot serialize are converted by a function looked up
+in a type-to-converter table. The table is filled on first encounter of each
+type, so subsequent values of that type are converted without type probing.
+
+If ``orjson`` is installed, it is used as a fast backend, with standard
+``json`` as a fallback for anything ``orjson`` refuses
+(e.g. integers over 64 bit or ``NaN`` in input).
+
+``NaN`` and infinity are written as ``null`` (as ``orjson`` does), bytes
+as lists of integers.
+
+"""
+
+import datetime
+import decimal
+import json
+from collections.abc import Collection, Generator, Mapping
+from ..islike import like_int, like_float
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_converters = {}  # type -> converter, filled on demand
+
+
+def _legacy(x):
+    """Converts values of unknown types, decision depends on the value."""
+    if like_int(x):
+        return int(x)
+    elif like_float(x):
+        return float(x)
+    else:
+        return None
+
+
+def _to_list(x):
+    return list(x)
+
+
+def _to_dict(x):
+    return dict(x)
+
+
+def _to_tolist(x):
+    return x.tolist()
+
+
+def _to_isoformat(x):
+    return x.isoformat()
+
+
+def _find_converter(tp):
+    if issubclass(tp, (datetime.date, datetime.time)):
+        return _to_isoformat
+    elif issubclass(tp, decimal.Decimal):
+        return float
+    elif callable(getattr(tp, 'tolist', None)):  # numpy, pandas
+        return _to_tolist
+    elif issubclass(tp, Mapping):
+        return _to_dict
+    elif issubclass(tp, Generator) or (
+            issubclass(tp, Collection) and not issubclass(tp, str)
+    ):
+        return _to_list
+    else:
+        return _legacy
+
+
+def convert(x):
+    """Converts ``x`` to a value that can be serialized to JSON."""
+    tp = type(x)
+    try:
+        converter = _converters[tp]
+    except KeyError:
+        converter = _converters[tp] = _find_converter(tp)
+    try:
+        return converter(x)
+    except (TypeError, ValueError):
+        return None
+
+
+def _null(_):
+    return None
+
+
+class StageEncoder(json.JSONEncoder):
+    """JSON Encoder helps json survive exotic data types, e.g. numpy."""
+    def default(self, x):
+        return convert(x)
+
+
+def dumps(content):
+    """Serializes ``content`` to JSON, returns bytes (UTF-8)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                content, default=convert,
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            )
+        except (orjson.JSONEncodeError, TypeError):
+            pass
+    text = json.dumps(content, cls=StageEncoder, ensure_ascii=False)
+    if 'NaN' in text or 'Infinity' in text:  # rare, rewritten as null
+        text = json.dumps(json.loads(text, parse_constant=_null),
+                          ensure_ascii=False)
+    return text.encode('utf-8')
+
+
+def loads(data):
+    """Deserializes JSON from bytes or str."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
@@ -1,4 +1,4 @@
-import collections
+from collections.abc import MutableMapping
 from .constants import (
     STAGE_HEAP, STAGE_WILD, STAGE_RUBRIC_EMPTY,
     MK_PAYLOAD, MK_RUBRIC, MK_NAME, MK_PART, MK_FORMAT
@@ -42,33 +42,153 @@ _default_replacements = {  # empty, true, false, none
     MK_FORMAT: ('',) * 4
 }
 
+_RESERVED = tuple(_default_replacements)
+_ABSENT = object()  # slot value of a removed key
+_MISSING = object()
 
-class MetaData(collections.UserDict):
+
+def _replacement(value, empty, true, false, none):
+    """Same as ``replace_value``, but returns the value (``_ABSENT``
+    instead of None) and skips ``str`` conversion of common types.
+    """
+    if value is None:
+        value = none
+    elif value is True:
+        value = true
+    elif value is False:
+        value = false
+    else:
+        tp = type(value)
+        if tp is str:
+            if not value or value.isspace():
+                value = empty
+        elif tp is not int and str(value).strip() == '':
+            value = empty
+    return _ABSENT if value is None else value
+
+
+class MetaData(MutableMapping):
     """
     Adds 'business logic' to the metadata, provides key-dependent defaults
+
+    Reserved keys are kept in slots, custom keys are copied from the source
+    mapping (copies of MetaData share them until first change).
+    Use ``data`` to get a plain dictionary.
     """
+    __slots__ = _RESERVED + ('_extra', '_own', '_sfx')
+
     def __init__(self, data):
-        super().__init__(data)
-        name = self.data.get(MK_NAME)
-        part = self.data.get(MK_PART)
+        if type(data) is MetaData:
+            data._copy_to(self)
+            return
+        get = data.get
+        name = get(MK_NAME)
+        for key in _RESERVED:
+            setattr(self, key, _replacement(
+                get(key), *_default_replacements[key]
+            ))
         # Allow for wildcard atomic operations
-        if part is False and name is None:
-            self.data[MK_NAME] = STAGE_WILD
-        for key in _default_replacements:
-            replace_value(self.data, key, *_default_replacements[key])
+        if name is None and get(MK_PART) is False:
+            setattr(self, MK_NAME, STAGE_WILD)
+        self._extra = dict(data)  # producer may reuse its mapping
+        self._own = True
         self._sfx = None
 
-    def __missing__(self, key):
+    def _copy_to(self, other):
+        for key in _RESERVED:
+            setattr(other, key, getattr(self, key))
+        other._extra = self._extra
+        other._own = self._own = False
+        other._sfx = self._sfx
+
+    def copy(self):
+        other = MetaData.__new__(MetaData)
+        self._copy_to(other)
+        return other
+
+    @property
+    def data(self):
+        """Plain dictionary of metadata."""
+        data = dict(self._extra)
+        for key in _RESERVED:
+            value = getattr(self, key)
+            if value is _ABSENT:
+                data.pop(key, None)
+            else:
+                data[key] = value
+        return data
+
+    def __getitem__(self, key):
         # Protect from KeyError
-        return None
+        if key in _default_replacements:
+            value = getattr(self, key)
+            return None if value is _ABSENT else value
+        return self._extra.get(key)
+
+    def __setitem__(self, key, value):
+        if key in _default_replacements:
+            setattr(self, key, value)
+            return
+        if not self._own:
+            self._extra = dict(self._extra)
+            self._own = True
+        self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _default_replacements:
+            if getattr(self, key) is _ABSENT:
+                raise KeyError(key)
+            setattr(self, key, _ABSENT)
+            return
+        if key not in self._extra:
+            raise KeyError(key)
+        if not self._own:
+            self._extra = dict(self._extra)
+            self._own = True
+        del self._extra[key]
+
+    def __contains__(self, key):
+        if key in _default_replacements:
+            return getattr(self, key) is not _ABSENT
+        return key in self._extra
+
+    def __iter__(self):
+        for key in _RESERVED:
+            if getattr(self, key) is not _ABSENT:
+                yield key
+        for key in self._extra:
+            if key not in _default_replacements:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(self.data)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def pop(self, key, default=_MISSING):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        if default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
 
     @property
     def sfx(self):
-        fmt = self.get(MK_FORMAT)
         if self._sfx is not None:
             return self._sfx
-        else:
-            return f".{fmt}" if fmt else ''
+        fmt = getattr(self, MK_FORMAT)
+        return f".{fmt}" if fmt and fmt is not _ABSENT else ''
 
     @sfx.setter
     def sfx(self, value):
@@ -77,6 +197,5 @@ class MetaData(collections.UserDict):
     @property
     def is_atomic(self):
         # Rule: atomic if name is specific (not heap) and no part present
-        name = self.get(MK_NAME)
-        part = self.get(MK_PART)
-        return name != STAGE_HEAP and part is None
+        name, part = getattr(self, MK_NAME), getattr(self, MK_PART)
+        return name != STAGE_HEAP and (part is _ABSENT or part is None)
@@ -0,0 +1,50 @@
+"""
+Background deletion of expired stage objects.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Reaper(threading.Thread):
+    """Daemon thread that calls ``Stage.reap`` every ``interval`` seconds.
+
+    Use as context manager or call ``start`` and ``stop``.
+    Errors of a reap are logged, the next reap is tried as usual.
+
+    Args:
+        stg: Stage instance
+        interval: seconds between reaps
+
+    """
+
+    def __init__(self, stg, interval=60):
+        super().__init__(daemon=True)
+        self.stg = stg
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.reaped = 0  # number of objects deleted so far
+        self.errors = 0  # number of failed reaps
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.reaped += len(self.stg.reap())
+            except Exception:
+                self.errors += 1
+                logger.exception('Reap failed')
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+
+    def __enter__(self):
+        if self.ident is None:  # not started yet
+            self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,251 @@
+"""
+Stage spread over several roots, e.g. one per disk.
+
+Objects are placed on shards by consistent hashing of (rubric, name),
+so all parts of a multipart content (and the heap of a rubric) stay
+on one shard, and adding a shard moves only a fraction of names.
+Requests are grouped by shard and executed in parallel threads,
+wildcard requests, queries and reaping fan out to all shards.
+
+"""
+
+import bisect
+import hashlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from .constants import STAGE_WILD, MK_PAYLOAD, MK_RUBRIC, MK_NAME
+from .metadata import MetaData
+from .reaper import Reaper
+from .stagecore import Stage, gen_dataflow, _MULTI_ACTIONS
+
+
+def _hash(key):
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class ShardedStage:
+    """Stage with the same interface as ``Stage``, sharded over ``paths``.
+
+    Args:
+        paths: paths to the topmost folders of shards (or Stage instances),
+            order of shards defines placement of objects
+        replicas: number of points per shard on the hash ring
+        workers: number of threads, by default one per shard
+        batch_size: number of dataflow items dispatched at once
+            by generator methods
+        **kwargs: arguments to ``Stage`` of every shard; note that
+            ``quota`` applies to each shard separately
+
+    """
+
+    def __init__(self, paths, replicas=64, workers=None, batch_size=256,
+                 **kwargs):
+        self.shards = [
+            path if isinstance(path, Stage) else Stage(path, **kwargs)
+            for path in paths
+        ]
+        if not self.shards:
+            raise ValueError("At least one shard path is required")
+        roots = [str(stg.topmost) for stg in self.shards]
+        if len(set(roots)) != len(roots):
+            raise ValueError("Shard paths must be distinct")
+        # Points depend on shard position, so that placement survives
+        # moving shards (see snapshot); appended shards take a fraction
+        ring = sorted(
+            (_hash(f"{n}#{i}"), n)
+            for n in range(len(self.shards)) for i in range(replicas)
+        )
+        self._ring_keys = [k for k, _ in ring]
+        self._ring_shards = [n for _, n in ring]
+        self.replicas = replicas
+        self.workers = workers or len(self.shards)
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix='stage-shard'
+        )
+
+    def close(self):
+        """Shuts down worker threads."""
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def shard_index(self, rubric, name):
+        """Returns index of the shard that holds ``name`` in ``rubric``."""
+        key = _hash(f"{rubric}/{name}")
+        i = bisect.bisect(self._ring_keys, key) % len(self._ring_keys)
+        return self._ring_shards[i]
+
+    def shard_of(self, metadata):
+        """Returns shard Stage for the given metadata."""
+        meta = MetaData(metadata)
+        return self.shards[self.shard_index(meta[MK_RUBRIC], meta[MK_NAME])]
+
+    def _route(self, metadata, action):
+        meta = MetaData(metadata)
+        if not meta[MK_PAYLOAD]:
+            return ()
+        if meta[MK_NAME] == STAGE_WILD and action in _MULTI_ACTIONS:
+            return range(len(self.shards))
+        return self.shard_index(meta[MK_RUBRIC], meta[MK_NAME]),
+
+    def _fan_out(self, calls):
+        """Runs ``(function, *args)`` calls in parallel, returns results."""
+        if len(calls) == 1:
+            function, *args = calls[0]
+            return [function(*args)]
+        futures = [self._executor.submit(*call) for call in calls]
+        return [future.result() for future in futures]
+
+    def _each(self, method, *args):
+        """Calls Stage ``method`` on all shards in parallel."""
+        return self._fan_out([
+            (getattr(stg, method), *args) for stg in self.shards
+        ])
+
+    @staticmethod
+    def _run(stg, items, action, tracked, removed):
+        results = []
+
+        def dataflow():
+            for position, item in items:
+                for result in stg._dispatch(item, action):
+                    results.append((position, result))
+                    yield result
+
+        flow = dataflow()
+        if tracked:
+            flow = stg._tracked(flow, removed=removed)
+        for _ in flow:
+            pass
+        return results
+
+    def _dispatch(self, dataflow, action, tracked=False, removed=False):
+        """Dispatches dataflow to shards batch by batch, results keep
+        the order of requests.
+        """
+        for batch in gen_dataflow(dataflow, self.batch_size):
+            routed = {}
+            for position, item in enumerate(batch):
+                for n in self._route(item[0], action):
+                    routed.setdefault(n, []).append((position, item))
+            results = [[] for _ in batch]
+            for shard_results in self._fan_out([
+                    (self._run, self.shards[n], items, action, tracked,
+                     removed)
+                    for n, items in routed.items()
+            ]):
+                for position, result in shard_results:
+                    results[position].append(result)
+            for item_results in results:
+                yield from item_results
+
+    def gsave(self, dataflow):
+        yield from self._dispatch(dataflow, 'write', tracked=True)
+
+    def gsave_many(self, dataflow, batch_size=None):
+        """Saves dataflow with ``Stage.gsave_many`` of every shard,
+        see ``Stage.gsave_many``.
+        """
+        for batch in gen_dataflow(dataflow, batch_size or sys.maxsize):
+            routed = {}
+            for item in batch:
+                for n in self._route(item[0], 'write'):
+                    routed.setdefault(n, []).append(item)
+            for shard_results in self._fan_out([
+                    (self.shards[n].save_many, items)
+                    for n, items in routed.items()
+            ]):
+                yield from shard_results
+
+    def gload(self, dataflow):
+        yield from self._dispatch(dataflow, 'read')
+
+    def gdelete(self, dataflow):
+        yield from self._dispatch(dataflow, 'unlink', tracked=True,
+                                  removed=True)
+
+    def gquery(self, rubric=None, where=None, content=False):
+        """Queries all shards, see ``Stage.gquery``."""
+        for shard_results in self._each('query', rubric, where, content):
+            yield from shard_results
+
+    def greap(self, now=None):
+        for shard_results in self._each('reap', now):
+            yield from shard_results
+
+    def start_reaper(self, interval=60):
+        """Starts and returns background ``Reaper`` thread."""
+        reaper = Reaper(self, interval)
+        reaper.start()
+        return reaper
+
+    def usage(self, rubric=None):
+        """Returns disk usage summed over shards, see ``Stage.usage``."""
+        total = {'bytes': 0, 'objects': 0}
+        for shard_usage in self._each('usage', rubric):
+            for key in total:
+                total[key] += shard_usage[key]
+        return total
+
+    def snapshot(self, dests, reflink=False):
+        """Snapshots every shard to the respective path of ``dests``,
+        see ``Stage.snapshot``.
+
+        Returns:
+            ShardedStage instance for the snapshot
+
+        """
+        dests = list(dests)
+        if len(dests) != len(self.shards):
+            raise ValueError("One destination per shard is required")
+        copies = self._fan_out([
+            (stg.snapshot, dest, reflink)
+            for stg, dest in zip(self.shards, dests)
+        ])
+        return ShardedStage(copies, replicas=self.replicas,
+                            workers=self.workers, batch_size=self.batch_size)
+
+    def export_archive(self, dests):
+        """Writes every shard to the respective archive of ``dests``,
+        see ``Stage.export_archive``.
+
+        Returns:
+            number of files archived
+
+        """
+        dests = list(dests)
+        if len(dests) != len(self.shards):
+            raise ValueError("One destination per shard is required")
+        return sum(self._fan_out([
+            (stg.export_archive, dest)
+            for stg, dest in zip(self.shards, dests)
+        ]))
+
+    def copy_payload(self, metadata, dest):
+        """Copies raw content files to ``dest``, see ``Stage.copy_payload``.
+        """
+        if isinstance(dest, (str, bytes)) or hasattr(dest, '__fspath__'):
+            with open(dest, 'wb') as file:
+                return self.copy_payload(metadata, file)
+        copied = 0
+        for item in gen_dataflow(metadata):
+            for n in self._route(item[0], 'locate'):
+                copied += self.shards[n].copy_payload(item, dest)
+        return copied
+
+    # Methods expressed in terms of the above are shared with Stage
+    save = Stage.save
+    save_many = Stage.save_many
+    load = Stage.load
+    delete = Stage.delete
+    query = Stage.query
+    reap = Stage.reap
+    save_frame = Stage.save_frame
+    load_frame = Stage.load_frame
+    payload = Stage.payload
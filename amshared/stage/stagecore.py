@@ -1,40 +1,88 @@
 from collections.abc import Mapping, Iterable
-import pathlib
+import itertools
+import tempfile
+import time
 from ..driverpack import DriverPack
 from .iodrivers import _default_io_pack
 from .metadata import MetaData
 from .constants import (
     STAGE_METADATA, STAGE_CONTENT, STAGE_WILD, STAGE_HEAP,
-    MK_PAYLOAD, MK_RUBRIC, MK_NAME, MK_PART, MK_ERROR
+    STAGE_META_FORMAT, STAGE_META_SFX,
+    MK_PAYLOAD, MK_RUBRIC, MK_NAME, MK_PART, MK_EXPIRES
 )
-from .internals import AtomicOps, PartOps, StageFolder
+from .backends import FileBackend
+from .index import (
+    MetaIndex, parse_condition, iter_meta, object_id, id_request
+)
+from .frames import (
+    FRAME_FORMAT, FRAME_GROUP, gen_frame_dataflow, concat_frames
+)
+from .reaper import Reaper
+from .usage import Accounting, scan_usage, total_usage
+from .internals import (
+    AtomicOps, PartOps, BatchOps, StageFolder, error_dataflow
+)
+
+
+def is_content(x):
+    """Tells if ``x`` is a single content item, though it may be iterable:
+    string, bytes-like object, array or DataFrame.
+    """
+    return (
+        isinstance(x, (str, bytes, bytearray, memoryview)) or
+        hasattr(type(x), '__array__')
+    )
+
+
+def _iter_dataflow(x):
+    stack = [iter((x,))]
+    while stack:
+        for chunk in stack[-1]:
+            if (
+                    isinstance(chunk, tuple) and
+                    len(chunk) == 2 and
+                    isinstance(chunk[0], Mapping)
+            ):
+                yield chunk
+            elif isinstance(chunk, Mapping):
+                yield chunk, None
+            elif is_content(chunk) or not isinstance(chunk, Iterable):
+                yield {}, chunk
+            else:
+                stack.append(iter(chunk))
+                break
+        else:
+            stack.pop()
 
 
-def gen_dataflow(x):
+def gen_dataflow(x, batch_size=None):
     """Generates dataflow from x, depending on the type of x
 
+    Nested iterables are flattened at any depth. Strings, bytes-like objects,
+    arrays and DataFrames are content items and are not iterated.
+
     Args:
         x: any object
+        batch_size: if given, lists of up to ``batch_size`` dataflow
+            items are generated, with metadata copied, as producers
+            may reuse their dictionaries
 
     Returns:
         generator
 
     """
-    if (
-            isinstance(x, tuple) and
-            len(x) == 2 and
-            isinstance(x[0], Mapping)
-    ):
-        yield x
-    elif isinstance(x, Mapping):
-        yield x, None
-    elif isinstance(x, str):
-        yield {}, x
-    elif isinstance(x, Iterable):
-        for chunk in x:
-            yield from gen_dataflow(chunk)
-    else:
-        yield {}, x
+    dataflow = _iter_dataflow(x)
+    if batch_size is None:
+        yield from dataflow
+        return
+    while True:
+        batch = [
+            (dict(metadata), content)
+            for metadata, content in itertools.islice(dataflow, batch_size)
+        ]
+        if not batch:
+            return
+        yield batch
 
 
 def call_method(method, meta):
@@ -54,10 +102,10 @@ def call_method(method, meta):
     try:
         return method()
     except (OSError, NotImplementedError) as e:
-        ometa = meta.copy()
-        ometa[MK_PAYLOAD] = False
-        ometa[MK_ERROR] = type(e).__name__
-        return ometa.data, None
+        return error_dataflow(meta, e)
+
+
+_MULTI_ACTIONS = ('read', 'unlink', 'locate')  # actions that allow wildcards
 
 
 class Rubric:
@@ -66,10 +114,10 @@ class Rubric:
     def __init__(self, stg, rubric):
         self.stg = stg
         self.name = rubric
-        self.folder = StageFolder(self.stg.topmetadata / rubric)
+        self.folder = StageFolder(self.stg.topmetadata / rubric, stg.backend)
 
     def exists(self):
-        return self.folder.path.exists()
+        return self.stg.backend.exists(self.folder.path)
 
     @property
     def atomic_names(self):
@@ -80,7 +128,7 @@ class Rubric:
         return self.folder.lsnames(files_only=False)
 
     def get_name_parts(self, name):
-        return StageFolder(self.folder / name).parts
+        return StageFolder(self.folder / name, self.stg.backend).parts
 
     @property
     def heap_parts(self):
@@ -94,6 +142,17 @@ class Stage:
         path: path to the topmost stage folder
         io_pack: instance of DriverPack with classes implementing read/write
             operations for the formats of files storing data flow content
+        index_keys: custom metadata keys to maintain secondary indexes for,
+            see ``query``
+        ttl: dictionary of rubric -> default time to live in seconds,
+            see ``reap``
+        track_usage: if True, disk usage is accounted on every write and
+            delete, see ``usage``
+        quota: dictionary of rubric -> maximum bytes, implies ``track_usage``;
+            writes to a rubric that reached its quota fail
+            with ``QuotaExceeded`` error
+        backend: storage backend, ``backends.FileBackend`` by default,
+            ``backends.MemoryBackend`` keeps stage in memory
 
         Operations are load, save and delete.
         Methods return (or yield, if method's rubric starts with 'g') metadata
@@ -101,26 +160,27 @@ class Stage:
 
     """
 
-    def __init__(self, path, io_pack=None):
+    def __init__(self, path, io_pack=None, index_keys=(), ttl=None,
+                 track_usage=False, quota=None, backend=None):
         if io_pack is None:
             io_pack = _default_io_pack
         self.iodp = DriverPack(io_pack)
-        if isinstance(path, pathlib.Path):
-            self.topmost = path
-        else:
-            self.topmost = pathlib.Path(path)
-        if self.topmost.exists() and not self.topmost.is_dir():
-            raise FileNotFoundError(f"Not a directory: '{self.topmost}'")
-        self.topmost.mkdir(parents=True, exist_ok=True)
+        self.backend = FileBackend() if backend is None else backend
+        self.topmost = self.backend.root(path)
         self.topcontent = self.topmost / STAGE_CONTENT
         self.topmetadata = self.topmost / STAGE_METADATA
+        self.index = MetaIndex(self, index_keys)
+        self.ttl = dict(ttl or {})
+        self.accounting = None
+        if track_usage or quota:
+            self.accounting = Accounting(self, quota)
 
     def _dispatch(self, dataflow, action):
         for metadata, content in gen_dataflow(dataflow):
             meta = MetaData(metadata)
             if not meta[MK_PAYLOAD]:
                 continue
-            if meta[MK_NAME] == STAGE_WILD and action in ('read', 'unlink'):
+            if meta[MK_NAME] == STAGE_WILD and action in _MULTI_ACTIONS:
                 rbc = Rubric(self, meta.get(MK_RUBRIC, ''))
                 if meta.is_atomic:
                     all_names = rbc.atomic_names
@@ -136,7 +196,7 @@ class Stage:
         if meta.is_atomic:
             pairops = AtomicOps(self, meta, content)
             method = getattr(pairops, action)
-            if meta[MK_NAME] == STAGE_WILD and action in ('read', 'unlink'):
+            if meta[MK_NAME] == STAGE_WILD and action in _MULTI_ACTIONS:
                 all_names = pairops.rdir.lsnames(files_only=True)
                 for name in all_names:
                     pairops.meta[MK_NAME] = name
@@ -163,24 +223,323 @@ class Stage:
             else:
                 yield call_method(method, pairops.meta)  # single part
 
+    def _tracked(self, dataflow, removed=False):
+        """Maintains indexes and usage accounting of changed objects."""
+        if self.index.keys:
+            dataflow = self.index.update(dataflow, removed=removed)
+        if self.accounting is not None:
+            dataflow = self.accounting.track(dataflow)
+        return dataflow
+
     def gsave(self, dataflow):
-        yield from self._dispatch(dataflow, 'write')
+        yield from self._tracked(self._dispatch(dataflow, 'write'))
 
     def save(self, dataflow):
         return [*self.gsave(dataflow)]
 
+    def gsave_many(self, dataflow, batch_size=None):
+        """Saves dataflow in batches grouped by rubric and name.
+
+        Faster than ``gsave`` for many small items: directories are created
+        and part numbers are allocated once per group.
+        Each batch of ``batch_size`` items (by default, the whole dataflow)
+        is consumed and grouped before the first write, resulting dataflow
+        follows group order rather than input order.
+
+        """
+        if batch_size is None:
+            batches = [gen_dataflow(dataflow)]
+        else:
+            batches = gen_dataflow(dataflow, batch_size)
+        for batch in batches:
+            groups = {}
+            for metadata, content in batch:
+                meta = MetaData(metadata)
+                if not meta[MK_PAYLOAD]:
+                    continue
+                key = meta[MK_RUBRIC], meta[MK_NAME], meta.is_atomic
+                groups.setdefault(key, []).append((meta, content))
+            for items in groups.values():
+                yield from self._tracked(
+                    BatchOps(self, items[0][0]).write(items)
+                )
+
+    def save_many(self, dataflow, batch_size=None):
+        return [*self.gsave_many(dataflow, batch_size)]
+
     def gload(self, dataflow):
+        """Loads dataflow.
+
+        If metadata has ``read_offset`` and/or ``read_length``, only
+        the given byte range of content is read, provided the format
+        driver supports it (``read_range`` method). Negative offset counts
+        from the end.
+
+        """
         yield from self._dispatch(dataflow, 'read')
 
     def load(self, dataflow):
         return [*self.gload(dataflow)]
 
     def gdelete(self, dataflow):
-        yield from self._dispatch(dataflow, 'unlink')
+        yield from self._tracked(self._dispatch(dataflow, 'unlink'),
+                                 removed=True)
 
     def delete(self, dataflow):
         return [*self.gdelete(dataflow)]
 
+    def gquery(self, rubric=None, where=None, content=False):
+        """Finds objects by metadata values.
+
+        Conditions on keys listed in ``index_keys`` are resolved with
+        secondary indexes, so only metadata of matching objects is read.
+        Otherwise, all metadata files (of the rubric) are scanned.
+
+        Args:
+            rubric: rubric to search in, None for all rubrics
+            where: dictionary of metadata key conditions, all of which must
+                be met; condition is either a value to be equal to
+                or ``(op, value)`` tuple, where op is one of
+                ``==, !=, <, <=, >, >=, in``
+            content: if True, content of matching objects is loaded
+
+        Yields:
+            dataflow of matching objects
+
+        """
+        where = dict(where or {})
+        indexed = {k: v for k, v in where.items() if k in self.index.keys}
+        other = [(k, parse_condition(v))
+                 for k, v in where.items() if k not in indexed]
+        if indexed:
+            oids = sorted(self.index.select(indexed), key=str)
+            request = (
+                ({MK_RUBRIC: r, MK_NAME: n, MK_PART: p}, False)
+                for r, n, p in oids if rubric is None or r == rubric
+            )
+            metas = (m for m, _ in self.gload(request) if m[MK_PAYLOAD])
+        else:
+            top = self.topmetadata
+            if rubric is not None:
+                top = top / rubric
+            metas = (
+                meta for _, meta in iter_meta(self, top)
+                if rubric is None or meta[MK_RUBRIC] == rubric
+            )
+        for meta in metas:
+            if all(k in meta and predicate(meta[k]) for k, predicate in other):
+                if content:
+                    yield from self.gload(({
+                        MK_RUBRIC: meta[MK_RUBRIC],
+                        MK_NAME: meta[MK_NAME],
+                        MK_PART: meta.get(MK_PART)
+                    }, True))
+                else:
+                    yield meta, None
+
+    def query(self, rubric=None, where=None, content=False):
+        return [*self.gquery(rubric, where, content)]
+
+    def _expired(self, now):
+        """Yields delete requests for objects expired by ``now``."""
+        seen = set()
+        meta_driver = self.iodp[STAGE_META_FORMAT]
+        # Rubric defaults: only metadata of old enough objects is read
+        for rubric, ttl in self.ttl.items():
+            top = self.topmetadata / rubric
+            for path in self.backend.iter_files(top, STAGE_META_SFX):
+                try:
+                    mtime = self.backend.stat(path)[1]
+                    if mtime + ttl > now:
+                        continue
+                    meta = self.backend.read(meta_driver, path)
+                except OSError:  # deleted meanwhile
+                    continue
+                if meta[MK_RUBRIC] != rubric and meta[MK_RUBRIC] in self.ttl:
+                    continue  # subrubric with its own default
+                oid = object_id(meta)
+                if meta.get(MK_EXPIRES, mtime + ttl) <= now:
+                    seen.add(oid)
+                    yield id_request(oid)
+        # Objects with their own time to live
+        expired = ('<=', now)
+        if MK_EXPIRES in self.index.keys:
+            oids = self.index.select({MK_EXPIRES: expired})
+        else:
+            oids = (object_id(meta) for meta, _ in self.gquery(
+                where={MK_EXPIRES: expired}))
+        for oid in oids:
+            if oid not in seen:
+                yield id_request(oid)
+
+    def greap(self, now=None):
+        """Deletes expired objects.
+
+        Object expires ``ttl`` seconds after save if its metadata has ``ttl``
+        key, or if its rubric has default time to live (see ``ttl``
+        parameter of Stage), in which case modification time of metadata file
+        is used to find expired objects.
+
+        Include ``expires`` in ``index_keys`` to avoid reading all metadata
+        files in search of objects with their own time to live.
+
+        No locks are taken: objects are deleted one by one, lazily, while
+        dataflow of deleted objects is consumed.
+
+        Args:
+            now: current time, seconds since the epoch
+
+        """
+        now = time.time() if now is None else now
+        yield from self.gdelete(self._expired(now))
+
+    def reap(self, now=None):
+        return [*self.greap(now)]
+
+    def start_reaper(self, interval=60):
+        """Starts and returns background ``Reaper`` thread."""
+        reaper = Reaper(self, interval)
+        reaper.start()
+        return reaper
+
+    def usage(self, rubric=None):
+        """Returns disk usage of the rubric or of the whole stage.
+
+        With ``track_usage``, usage is known from incrementally maintained
+        counters, otherwise the stage is scanned.
+
+        Returns:
+            dictionary with total ``bytes`` and ``objects``
+
+        """
+        if self.accounting is not None:
+            return self.accounting.usage(rubric)
+        else:
+            return total_usage(scan_usage(self), rubric)
+
+    def snapshot(self, dest, reflink=False):
+        """Creates point-in-time copy of the stage in no time.
+
+        Files are hardlinked (or reflinked, if ``reflink`` is True and
+        filesystem supports it), so snapshot takes time proportional
+        to the number of files, not to the size of data.
+        Subsequent writes to either stage replace files rather than change
+        them in place, so they do not affect each other.
+
+        Args:
+            dest: path to the snapshot folder, must not exist or be empty
+            reflink: try copy-on-write clones before hardlinks
+
+        Returns:
+            Stage instance for the snapshot
+
+        """
+        dest = self.backend.root(dest)
+        if self.backend.listdir(dest):
+            raise FileExistsError(f"Snapshot destination not empty: '{dest}'")
+        self.backend.snapshot(self.topmost, dest, use_reflink=reflink)
+        acct = self.accounting
+        return Stage(dest, io_pack=self.iodp.pack, backend=self.backend,
+                     index_keys=self.index.keys, ttl=self.ttl,
+                     track_usage=acct is not None,
+                     quota=acct.quota if acct is not None else None)
+
+    def export_archive(self, dest):
+        """Writes stage to zip or tar archive.
+
+        Stage can be served from archive with ``backends.ArchiveBackend``.
+        Archive type is chosen by ``dest`` suffix, see ``FileBackend.export``.
+        Stages not stored in files are exported via temporary copy
+        without indexes and usage logs: stage served from archive
+        builds them in memory when needed.
+
+        Returns:
+            number of files archived
+
+        """
+        if hasattr(self.backend, 'export'):
+            return self.backend.export(self.topmost, dest)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            copy = Stage(tmp_dir, io_pack=self.iodp.pack)
+            requests = (
+                (id_request(object_id(meta)), True)
+                for _, meta in iter_meta(self, self.topmetadata)
+            )
+            copy.save_many(self.gload(requests))
+            return copy.export_archive(dest)
+
+    def save_frame(self, df, rubric, name, by=None, chunk_size=None,
+                   fmt=FRAME_FORMAT, append=False):
+        """Saves pandas DataFrame as multipart content in bulk.
+
+        Rows are split into parts by ``by`` groups (group key is saved in
+        ``group`` metadata of the part) or into chunks of ``chunk_size``
+        rows, see ``frames.gen_frame_dataflow``.
+
+        Args:
+            append: if False, existing parts of the name are deleted first
+
+        Returns:
+            dataflow of saved parts
+
+        """
+        if not append:
+            self.delete({MK_RUBRIC: rubric, MK_NAME: name, MK_PART: True})
+        return self.save_many(
+            gen_frame_dataflow(df, rubric, name, by, chunk_size, fmt))
+
+    def load_frame(self, rubric, name, groups=None, **kwargs):
+        """Loads multipart content saved with ``save_frame`` as DataFrame.
+
+        Args:
+            groups: keys of groups to load, all parts are loaded if None
+            **kwargs: arguments to ``pandas.concat``
+
+        Returns:
+            DataFrame or None, if there is no content
+
+        """
+        parts = {MK_RUBRIC: rubric, MK_NAME: name, MK_PART: True}
+        request = parts
+        if groups is not None:
+            groups = [list(g) if isinstance(g, tuple) else g for g in groups]
+            request = (
+                ({**parts, MK_PART: meta[MK_PART]}, True)
+                for meta, _ in self.gload((parts, False))
+                if meta[MK_PAYLOAD] and meta.get(FRAME_GROUP) in groups
+            )
+        return concat_frames(
+            (content for meta, content in self.gload(request)
+             if meta[MK_PAYLOAD]),
+            **kwargs
+        )
+
+    def copy_payload(self, metadata, dest):
+        """Copies raw content files of all parts, in order, to ``dest``.
+
+        Content is not loaded: bytes of content files are concatenated,
+        by kernel when possible (see ``backends.copy_stream``),
+        in constant memory.
+        Meaningful for formats that store content as is, e.g. text,
+        bytes or JSON Lines.
+
+        Args:
+            metadata: dictionary of metadata (rubric, name, format, etc.)
+            dest: path or binary file object to write to
+
+        Returns:
+            number of bytes copied
+
+        """
+        if isinstance(dest, (str, bytes)) or hasattr(dest, '__fspath__'):
+            with open(dest, 'wb') as file:
+                return self.copy_payload(metadata, file)
+        copied = 0
+        for meta, path in self._dispatch(metadata, 'locate'):
+            if meta[MK_PAYLOAD]:
+                copied += self.backend.copy_to(path, dest)
+        return copied
+
     def payload(self, metadata, joiner=None):
         """Loads and returns all content for a particular metadata.
 
@@ -189,7 +548,7 @@ class Stage:
         Args:
             metadata: dictionary of metadata (rubric, name, format, etc.)
             joiner: function to join multipart content into one value,
-                should be able to handle generator
+                should be able to handle generator, see ``joiners``
 
         Returns:
             list of content
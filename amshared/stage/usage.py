@@ -0,0 +1,155 @@
+"""
+Incremental accounting of stage disk usage and per-rubric quotas.
+
+Changes in bytes and object counts are appended to a log
+(JSON Lines file of ``[rubric, bytes, objects]`` records) by every Stage
+instance that writes or deletes objects. Usage is the sum of the records,
+so it is known without traversing stage folders.
+If the log is missing, it is rebuilt by a one-time scan of the stage.
+
+Note:
+    Changes made by Stage instances that do not track usage are not logged,
+    call ``Accounting.rebuild`` to recount.
+
+"""
+
+import threading
+from .constants import STAGE_INDEX, MK_RUBRIC
+from .index import append_records, read_records, iter_meta
+from .internals import AtomicOps, PartOps, account
+from .metadata import MetaData
+
+USAGE_LOG = '__usage__.jsonl'
+
+
+class QuotaExceeded(OSError):
+    """Raised on attempt to write to a rubric that exceeded its quota."""
+
+
+def scan_usage(stg):
+    """Returns dictionary of rubric -> [bytes, objects] scanning the stage."""
+    counters = {}
+    for _, metadata in iter_meta(stg, stg.topmetadata):
+        meta = MetaData(metadata)
+        ops = (AtomicOps if meta.is_atomic else PartOps)(stg, meta, None)
+        nbytes, exists = account(stg.backend, ops.mfile, ops.cfile)
+        counter = counters.setdefault(meta[MK_RUBRIC], [0, 0])
+        counter[0] += nbytes
+        counter[1] += exists
+    return counters
+
+
+def total_usage(counters, rubric=None):
+    """Sums up counters of the ``rubric`` or of all rubrics."""
+    nbytes = nobjects = 0
+    for r, (b, o) in counters.items():
+        if rubric is None or r == rubric:
+            nbytes += b
+            nobjects += o
+    return {'bytes': nbytes, 'objects': nobjects}
+
+
+class Accounting:
+    """Keeps track of bytes and objects per rubric.
+
+    Args:
+        stg: Stage instance
+        quota: dictionary of rubric -> maximum bytes
+
+    """
+
+    def __init__(self, stg, quota=None):
+        self.stg = stg
+        self.quota = dict(quota or {})
+        self.path = stg.topmost / STAGE_INDEX / USAGE_LOG
+        self._counters = {}  # rubric -> [bytes, objects], from log
+        self._pending = {}  # rubric -> [bytes, objects], not yet in log
+        self._offset = 0
+        self._in_memory = False  # log can not be written
+        self.lock = threading.RLock()  # shared with reaper, writer threads
+
+    def sync(self):
+        """Reads log records appended since last call, rebuilds missing log.
+        """
+        with self.lock:
+            self._sync()
+
+    def _sync(self):
+        backend = self.stg.backend
+        if not self._in_memory and not backend.exists(self.path):
+            self.rebuild()
+        if self._in_memory:
+            return
+        offset = self._offset
+        for (rubric, nbytes, nobjects), offset in read_records(
+                backend, self.path, offset):
+            counter = self._counters.setdefault(rubric, [0, 0])
+            counter[0] += nbytes
+            counter[1] += nobjects
+        self._offset = offset
+
+    def rebuild(self):
+        """Counts usage from scratch scanning the stage.
+
+        Usage of read-only stages (e.g. served from archive) is kept
+        in memory only.
+
+        """
+        backend = self.stg.backend
+        counters = scan_usage(self.stg)
+        try:
+            if backend.exists(self.path):
+                backend.unlink(self.path)
+            append_records(backend, self.path,
+                           [[r, *c] for r, c in counters.items()])
+        except PermissionError:
+            self._in_memory = True
+            self._counters = {r: list(c) for r, c in counters.items()}
+            return
+        self._counters = {}
+        self._offset = 0
+
+    def check(self, rubric):
+        """Raises ``QuotaExceeded`` if rubric has no room for writes."""
+        if rubric not in self.quota:
+            return
+        if self.usage(rubric, sync=False)['bytes'] >= self.quota[rubric]:
+            raise QuotaExceeded(f"Quota exceeded for rubric '{rubric}'")
+
+    def change(self, rubric, nbytes, nobjects):
+        """Records change in usage, to be logged by ``flush``."""
+        if nbytes or nobjects:
+            with self.lock:
+                counter = self._pending.setdefault(rubric, [0, 0])
+                counter[0] += nbytes
+                counter[1] += nobjects
+
+    def flush(self):
+        """Appends pending changes to the log."""
+        with self.lock:
+            if self._pending:
+                records = [[r, *c] for r, c in self._pending.items()]
+                self._pending = {}
+                append_records(self.stg.backend, self.path, records)
+
+    def track(self, dataflow):
+        """Yields dataflow unchanged, flushes changes when it is exhausted
+        or abandoned.
+        """
+        self.sync()
+        try:
+            for metadata, content in dataflow:
+                yield metadata, content
+        finally:
+            self.flush()
+
+    def usage(self, rubric=None, sync=True):
+        """Returns dictionary with total ``bytes`` and ``objects``
+        of a rubric or of the whole stage.
+        """
+        with self.lock:
+            if sync:
+                self._sync()
+            logged = total_usage(self._counters, rubric)
+            pending = total_usage(self._pending, rubric)
+        return {k: logged[k] + pending[k] for k in logged}
@@ -0,0 +1,58 @@
+"""
+Startup benchmark of DriverPack with heavy driver modules.
+
+Each variant runs in a fresh interpreter: it builds a pack with
+a light driver and heavy ones (pandas, numpy), then uses the light driver
+only. Heavy drivers are either imported up front or given as import
+strings that are resolved on first instantiation.
+
+Run from the repository root::
+
+    PYTHONPATH=. python benchmarks/bench_driverpack_startup.py
+
+"""
+
+import statistics
+import subprocess
+import sys
+
+EAGER = """
+import pandas, numpy.random
+from amshared.driverpack import DriverPack
+pack = {'frame': pandas.DataFrame, 'rng': numpy.random.Generator,
+        'decoder': __import__('json').JSONDecoder}
+DriverPack(pack)['decoder']
+"""
+
+LAZY = """
+from amshared.driverpack import DriverPack
+pack = {'frame': 'pandas:DataFrame', 'rng': 'numpy.random:Generator',
+        'decoder': 'json:JSONDecoder'}
+DriverPack(pack)['decoder']
+"""
+
+TIMED = """
+import time
+start = time.perf_counter()
+exec({code!r})
+print(time.perf_counter() - start)
+"""
+
+
+def run(code, repeat=5):
+    times = [
+        float(subprocess.check_output(
+            [sys.executable, '-c', TIMED.format(code=code)]))
+        for _ in range(repeat)
+    ]
+    return statistics.median(times)
+
+
+def main():
+    eager, lazy = run(EAGER), run(LAZY)
+    print(f"eager imports {eager * 1e3:7.1f} ms")
+    print(f"import specs  {lazy * 1e3:7.1f} ms  x{eager / lazy:.1f}")
+
+
+if __name__ == '__main__':
+    main()
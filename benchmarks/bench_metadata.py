@@ -0,0 +1,81 @@
+"""
+Microbenchmark of metadata handling per dataflow item.
+
+Compares ``MetaData`` against the former ``UserDict``-based implementation
+on what the dispatch loop does with each item: wrap, copy, read
+reserved keys and produce a plain dictionary.
+
+Run from the repository root::
+
+    PYTHONPATH=. python benchmarks/bench_metadata.py
+
+"""
+
+import collections
+import timeit
+from amshared.stage.metadata import (
+    MetaData, replace_value, _default_replacements
+)
+from amshared.stage.constants import (
+    STAGE_HEAP, STAGE_WILD, MK_PAYLOAD, MK_NAME, MK_PART, MK_FORMAT
+)
+
+
+class LegacyMetaData(collections.UserDict):
+    def __init__(self, data):
+        super().__init__(data)
+        name = self.data.get(MK_NAME)
+        part = self.data.get(MK_PART)
+        if part is False and name is None:
+            self.data[MK_NAME] = STAGE_WILD
+        for key in _default_replacements:
+            replace_value(self.data, key, *_default_replacements[key])
+        self._sfx = None
+
+    def __missing__(self, key):
+        return None
+
+    @property
+    def sfx(self):
+        fmt = self.get(MK_FORMAT)
+        if self._sfx is not None:
+            return self._sfx
+        else:
+            return f".{fmt}" if fmt else ''
+
+    @property
+    def is_atomic(self):
+        return self.get(MK_NAME) != STAGE_HEAP and self.get(MK_PART) is None
+
+
+def item_cycle(cls, metadata):
+    meta = cls(metadata)
+    if not meta[MK_PAYLOAD]:
+        return None
+    meta = meta.copy()  # PairOps
+    meta.is_atomic, meta.sfx, meta[MK_PART]
+    return meta.data
+
+
+def main(number=100_000):
+    samples = {
+        'heap': {'rubric': 'main'},
+        'part': {'rubric': 'main', 'name': 'x', 'part': 7, 'format': 'json'},
+        'custom': {'rubric': 'main', 'name': 'x', 'part': True,
+                   'group': 'a', 'source': 'feed', 'ttl': 60},
+    }
+    for label, metadata in samples.items():
+        times = {
+            cls.__name__: min(timeit.repeat(
+                lambda: item_cycle(cls, metadata), number=number, repeat=3
+            ))
+            for cls in (LegacyMetaData, MetaData)
+        }
+        legacy, fast = times['LegacyMetaData'], times['MetaData']
+        print(f"{label:8} legacy {legacy / number * 1e6:6.2f} us  "
+              f"slots {fast / number * 1e6:6.2f} us  "
+              f"x{legacy / fast:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Per-call overhead of ``pipe.run`` versus ``pipe.compile``.
+
+Run from the repository root::
+
+    PYTHONPATH=. python benchmarks/bench_pipe.py
+
+"""
+
+import timeit
+from amshared import pipe
+
+
+def scale(x, n):
+    return x * n
+
+
+def main(number=200_000):
+    steps = (
+        pipe.call(scale, 3),
+        pipe.method('__add__', 1),
+        pipe.tee(id),
+        lambda x: x - 1,
+    )
+    compiled = pipe.compile(*steps)
+    assert compiled(2) == pipe.run(*steps, initial=2)
+    times = {
+        'run': min(timeit.repeat(
+            lambda: pipe.run(*steps, initial=2), number=number, repeat=5)),
+        'compile': min(timeit.repeat(
+            lambda: compiled(2), number=number, repeat=5)),
+    }
+    for label, seconds in times.items():
+        print(f"{label:8} {seconds / number * 1e9:6.0f} ns per call")
+    print(f"speedup  x{times['run'] / times['compile']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
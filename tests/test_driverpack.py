@@ -1,5 +1,16 @@
+import asyncio
+import collections
+import inspect
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import pytest
-from amshared.driverpack import DriverPack
+from amshared.driverpack import DriverPack, DependencyCycleError
 
 
 def test_driverpack_singleton(drvpack):
@@ -113,3 +124,385 @@ def test_driverpack_with(drvpack):
         box = dp['secret']
     assert hasattr(box, 'reveal') is True
     assert hasattr(box, 'content') is False
+
+
+def test_driverpack_graph(drvpack, monkeypatch):
+    dp = DriverPack(drvpack, singleton=True, autoinject=True)
+    dp.pack.update(x=lambda: 11, a=lambda x: f"{x}?")
+    assert dp['fun']() == "'11?' is 11"
+    assert dp.graph.requires['fun'] == ('x', 'a')
+    assert dp.graph.dependents['x'] == {'fun', 'a'}
+    calls = []
+    signature = inspect.signature
+    monkeypatch.setattr(inspect, 'signature',
+                        lambda f: calls.append(f) or signature(f))
+    dp.cascade_delete('x')
+    assert not dp.data
+    assert dp['fun']() == "'11?' is 11"
+    assert calls == []  # graph is compiled once
+    dp.pack['y'] = lambda: 2
+    dp['b'] = 'two'
+    assert dp['cls']() == "'two' means 2"
+    assert len(calls) == len(dp.pack)  # recompiled after change
+    dp = DriverPack(drvpack, autoinject=True)
+    assert 'fun' in dp.graph.keys
+    dp.pack = {'x': lambda: 5}
+    assert dp.graph.keys == {'x'}  # new pack is compiled, same version
+
+
+def test_driverpack_cycle(drvpack):
+    dp = DriverPack(drvpack, singleton=True, autoinject=True)
+    created = []
+    dp.pack.update(
+        x=lambda a: created.append('x'),
+        a=lambda y: created.append('a'),
+        y=lambda x: created.append('y')
+    )
+    with pytest.raises(DependencyCycleError, match='x -> a -> y -> x'):
+        dp['fun']
+    assert created == []
+    dp['y'] = 2  # value breaks the cycle
+    assert dp['fun']() == "'None' is None"
+    assert created == ['a', 'x']
+
+
+def test_driverpack_threadsafe_stress(tmp_path, monkeypatch):
+    created = collections.Counter()
+    b_started = threading.Event()
+
+    def driver(key):
+        def make():
+            created[key] += 1
+            time.sleep(0.001)
+            return object()
+        return make
+
+    def slow_a():
+        created['slow_a'] += 1
+        return b_started.wait(5)  # True only if 'slow_b' runs concurrently
+
+    def slow_b():
+        created['slow_b'] += 1
+        b_started.set()
+        return True
+
+    pack = {f"k{i}": driver(f"k{i}") for i in range(8)}
+    dp = DriverPack(pack, singleton=True, threadsafe=True)
+    barrier = threading.Barrier(32)
+
+    def hammer(seed):
+        keys = [*pack] * 20
+        random.Random(seed).shuffle(keys)
+        barrier.wait()
+        return [(key, dp[key]) for key in keys]
+
+    with ThreadPoolExecutor(32) as pool:
+        results = [r for rs in pool.map(hammer, range(32)) for r in rs]
+    assert created == {key: 1 for key in pack}
+    assert all(inst is dp[key] for key, inst in results)
+    del dp['k1']
+    assert dp['k1'] is not None and created['k1'] == 2
+
+    dp.pack.update(slow_a=slow_a, slow_b=slow_b)
+    with ThreadPoolExecutor(2) as pool:
+        a = pool.submit(dp.__getitem__, 'slow_a')
+        b = pool.submit(dp.__getitem__, 'slow_b')
+        assert a.result() is True and b.result() is True  # no global lock
+
+    # consumers of the same lazy dependency import it once
+    (tmp_path / 'slow_import.py').write_text(
+        'import time\ntime.sleep(0.05)\n\n\nclass Driver:\n    pass\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    dp = DriverPack({'dep': 'slow_import:Driver',
+                     'a': lambda dep: dep, 'b': lambda dep: dep},
+                    autoinject=True, threadsafe=True)
+    with ThreadPoolExecutor(2) as pool:
+        a = pool.submit(dp.__getitem__, 'a')
+        b = pool.submit(dp.__getitem__, 'b')
+        assert a.result() is b.result() is dp['dep']
+
+
+def test_driverpack_warmup(drvpack):
+    def slow(delay):
+        def make():
+            time.sleep(delay)
+            return delay
+        return make
+
+    dp = DriverPack(drvpack, singleton=True, autoinject=True)
+    dp.pack.update({f"s{i}": slow(0.05) for i in range(8)})
+    dp.pack.update(x=slow(0.05), a=lambda x: f"{x}s")
+    dp['b'] = 'bee'
+    assert dp.graph.levels(['fun', 's0']) == [['x', 's0'], ['a'], ['fun']]
+    start = time.perf_counter()
+    timings = dp.warmup(['fun', *(f"s{i}" for i in range(8))], workers=16)
+    assert time.perf_counter() - start < 0.05 * 9 / 2  # in parallel
+    assert timings.keys() == {'x', 'a', 'fun', *(f"s{i}" for i in range(8))}
+    assert all(timings[f"s{i}"] >= 0.05 for i in range(8))
+    assert dp['fun']() == "'0.05s' is 0.05"
+    assert dp.warmup(['fun', 's0']) == {}  # ready
+    with pytest.raises(TypeError, match='y'):
+        dp.warmup(['cls'])
+
+
+def test_driverpack_async():
+    events = []
+
+    class Connection:
+        def __init__(self, name):
+            self.name = name
+
+        async def aclose(self):
+            await asyncio.sleep(0)
+            events.append(f"closed {self.name}")
+
+    def connect(name):
+        async def factory():
+            events.append(f"start {name}")
+            await asyncio.sleep(0.05)
+            return Connection(name)
+        return factory
+
+    async def service(db, cache):
+        return db.name, cache.name
+
+    pack = {'db': connect('db'), 'cache': connect('cache'), 'svc': service}
+
+    async def main():
+        async with DriverPack(pack, autoinject=True) as dp:
+            start = time.perf_counter()
+            first, second = await asyncio.gather(
+                dp.aget('svc'), dp.aget('svc'))
+            assert time.perf_counter() - start < 0.1  # concurrent
+            assert first == second == ('db', 'cache')
+            assert events == ['start db', 'start cache']
+            assert await dp.aget('db') is dp['db']
+            assert await dp.aget('missing') is None
+        assert sorted(events[2:]) == ['closed cache', 'closed db']
+
+    asyncio.run(main())
+
+
+def test_driverpack_pool(drvpack):
+    dp = DriverPack(drvpack, pools={'secret': 2})
+    dp['content'] = 'Secret'
+    with dp.checkout('secret') as first:
+        with dp.checkout('secret') as second:
+            assert first is not second
+            with pytest.raises(TimeoutError):
+                with dp.checkout('secret', timeout=0.01):
+                    pass
+        with dp.checkout('secret') as third:
+            assert third is second  # idle instance is reused
+    with pytest.raises(KeyError):
+        with dp.checkout('fun'):
+            pass
+
+    def borrow(_):
+        with dp.checkout('secret') as box:
+            time.sleep(0.01)
+            return id(box)
+
+    with ThreadPoolExecutor(8) as pool:
+        assert set(pool.map(borrow, range(32))) <= {id(first), id(second)}
+    with dp.checkout('secret') as lent:
+        idle = second if lent is first else first
+        dp.close()
+        assert not hasattr(idle, 'content')  # idle instances are closed
+        assert hasattr(lent, 'content')
+    assert not hasattr(lent, 'content')  # closed on return
+
+
+def test_driverpack_eviction(drvpack):
+    made = collections.Counter()
+
+    class Token:
+        def __init__(self, name):
+            made[name] += 1
+            self.name = f"{name}{made[name]}"
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+        def __str__(self):
+            return self.name
+
+    def token(name):
+        return lambda: Token(name)
+
+    dp = DriverPack(
+        {**drvpack, 'x': token('x'), 'a': token('a')},
+        autoinject=True, ttl={'x': 0.05},
+        health={'a': lambda inst: not inst.closed}
+    )
+    fun, x = dp['fun'], dp['x']
+    assert fun() == "'a1' is x1"
+    time.sleep(0.06)
+    assert 'fun' in dp and dp['x'] is not x
+    assert x.closed and 'fun' not in dp  # expired with dependents
+    assert dp['fun']() == "'a1' is x2"
+    dp['a'].close()  # fails health check on next access
+    assert dp['a'].name == 'a2' and 'fun' not in dp
+    assert dp['fun']() == "'a2' is x2"
+    dp['y'], dp['b'] = 2, 'bee'
+    time.sleep(0.06)
+    assert dp['cls']() == "'bee' means 2"  # values are not evicted
+
+    dp = DriverPack({**drvpack, 'x': token('x'), 'a': token('a')},
+                    autoinject=True, max_instances=3)
+    assert dp['fun'] is dp['fun']
+    assert [*dp] == ['x', 'a', 'fun']
+    dp['y'], dp['b'] = 2, 'bee'
+    dp['cls']  # least recently used 'x' is evicted with 'fun'
+    assert [*dp] == ['a', 'y', 'b', 'cls']
+    dp['fun']  # 'a' is kept as dependency of 'fun', 'cls' is evicted
+    assert [*dp] == ['a', 'y', 'b', 'x', 'fun']
+
+    with DriverPack({'x': token('x')}, ttl={'x': 0.05},
+                    instrument=True) as dp:
+        x = dp['x']
+        time.sleep(0.06)
+    assert x.closed and x.name == f"x{made['x']}"  # not remade to close
+    assert dp.stats.node('x')['hits'] == 0 and not dp
+
+
+def test_driverpack_lazy_import(drvpack):
+    dp = DriverPack({**drvpack, 'box': 'tests.conftest:Concealed',
+                     'missing': 'no_such_module:Driver',
+                     'decoder': 'json.JSONDecoder'}, autoinject=True)
+    dp['content'] = 'Secret'
+    assert dp['secret'].reveal() == 'Secret'
+    assert set(dp.graph.pending) == {'box', 'missing', 'decoder'}
+    assert dp['box'].reveal() == 'Secret'
+    assert dp['decoder'].decode('[1]') == [1]
+    with pytest.raises(ModuleNotFoundError):
+        dp['missing']
+    assert set(dp.graph.pending) == {'missing'}
+    dp.cascade_delete('content')
+    assert [*dp] == ['decoder']
+
+
+class Process:
+    def __init__(self, label='pid'):
+        self.label = f"{label} {os.getpid()}"
+
+
+_shared = {}  # packs inherited by forked processes
+
+
+def process_label(dp):
+    return [*dp.data], dp['proc'].label
+
+
+def shared_label(name):
+    return process_label(_shared[name])
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='fork is not available')
+def test_driverpack_fork():
+    context = multiprocessing.get_context('fork')
+    for on_fork in ('drop', 'recreate', None):
+        dp = _shared[on_fork] = DriverPack({'proc': Process}, on_fork=on_fork)
+        dp['x'] = 11
+        parent = dp['proc']
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            keys, label = pool.submit(shared_label, on_fork).result()
+        if on_fork == 'drop':
+            assert keys == ['x']
+        else:
+            assert keys == ['x', 'proc']
+        assert (label == parent.label) is (on_fork is None)
+        assert dp['proc'] is parent
+
+
+def test_driverpack_spawn():
+    dp = DriverPack({'proc': 'tests.test_driverpack:Process'},
+                    pools={'proc': 2}, ttl={'proc': 60})
+    dp['x'] = 11
+    parent = dp['proc']
+    copy = pickle.loads(pickle.dumps(dp))
+    assert copy.data == {'x': 11}  # no instances
+    assert copy.pools['proc'].size == 2 and copy.ttl == {'proc': 60}
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(1, mp_context=context) as pool:
+        keys, label = pool.submit(process_label, dp).result()
+    assert keys == ['x'] and label != parent.label
+
+
+def test_driverpack_instrument(drvpack):
+    dp = DriverPack({**drvpack, 'x': lambda: 11, 'a': 'json:JSONDecoder'},
+                    autoinject=True, instrument=True)
+    dp.pack['a'] = lambda: 'eleven'
+    dp['content'] = 'Secret'
+    dp['fun'], dp['fun'], dp['content']
+    dp.cascade_delete('x')
+    stats = dp.stats
+    assert stats.instantiations == {'x': 1, 'a': 1, 'fun': 1}
+    assert stats.hits == {'fun': 1, 'content': 1}
+    assert stats.closes == {'x': 1, 'fun': 1}
+    assert stats.edges == {('fun', 'x'): 1, ('fun', 'a'): 1}
+    assert stats.max_seconds['x'] <= stats.seconds['x']
+    exported = json.loads(dp.export_graph())
+    nodes = {node['key']: node for node in exported['nodes']}
+    assert nodes['a']['state'] == 'instance'
+    assert nodes['fun']['state'] == 'driver'
+    assert nodes['content']['state'] == 'value'
+    assert nodes['fun']['instantiations'] == 1
+    assert {'consumer': 'secret', 'argument': 'content',
+            'injected': 0} in exported['edges']
+    dot = dp.export_graph('dot')
+    assert dot.startswith('digraph') and '"fun" -> "x" [label=1];' in dot
+    with pytest.raises(ValueError):
+        dp.export_graph('svg')
+
+
+def test_driverpack_threadsafe_eviction():
+    made = collections.Counter()
+
+    def dep():
+        made['dep'] += 1
+        return object()
+
+    def consumer(dep):
+        made['k'] += 1
+        return object()
+
+    for policy in ({'ttl': {'dep': 0.0005, 'k': 0.001}},
+                   {'max_instances': 1},
+                   {'health': {'dep': lambda inst: random.random() > 0.3}}):
+        dp = DriverPack({'dep': dep, 'k': consumer}, autoinject=True,
+                        threadsafe=True, **policy)
+
+        def hammer(seed):
+            rnd = random.Random(seed)
+            for _ in range(300):
+                dp[rnd.choice(('k', 'dep'))]
+
+        threads = [threading.Thread(target=hammer, args=(n,), daemon=True)
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        assert not any(thread.is_alive() for thread in threads), policy
+        assert made['dep'] > 1
+
+    # 'k' is stored (under its key lock) while 'dep' fails health check
+    # (under eviction lock) and cascades to 'k'
+    def slow_consumer(dep):
+        time.sleep(0.05)
+        return object()
+
+    dp = DriverPack({'dep': object, 'k': slow_consumer}, autoinject=True,
+                    threadsafe=True,
+                    health={'dep': lambda inst: time.sleep(0.1)})
+    consumer_thread = threading.Thread(target=lambda: dp['k'], daemon=True)
+    consumer_thread.start()
+    time.sleep(0.02)
+    dep_thread = threading.Thread(target=lambda: dp['dep'], daemon=True)
+    dep_thread.start()
+    for thread in (consumer_thread, dep_thread):
+        thread.join(5)
+        assert not thread.is_alive()
+    assert 'k' not in dp.data
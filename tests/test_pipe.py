@@ -68,3 +68,36 @@ def test_pipe_tee_method(secret, capsys):
     )
     captured = capsys.readouterr()
     assert captured.out == "secret\n"
+
+
+def test_pipe_compile(secret, capsys):
+    def xn(x, n, prefix=''):
+        return prefix + str(x * n)
+
+    steps = (
+        lambda x: x + 1,
+        pipe.call(xn, 2, prefix='x='),
+        pipe.tee(print, end='!\n'),
+        pipe.tee_method('startswith', 'x'),
+        pipe.method('replace', 'x', 'y', 1),
+        pipe.call(str.upper),
+    )
+    compiled = pipe.compile(*steps)
+    for initial in (1, 20):
+        assert compiled(initial) == pipe.run(*steps, initial=initial)
+    assert capsys.readouterr().out == "x=4!\nx=4!\nx=42!\nx=42!\n"
+    assert 'getattr' not in compiled.source
+    assert pipe.compile()(5) == 5 and pipe.compile()() is None
+    revealed = pipe.compile(pipe.load(secret), pipe.method('reveal', False))
+    assert revealed() == 'secret'
+    weird = pipe.compile(pipe.method('__getitem__', 0),
+                         pipe.call(lambda x, **kw: kw[x], **{'a b': 1}))
+    assert weird(['a b']) == 1
+
+    class Counter:
+        step = 'load', 0  # not to be mistaken for a pipe step
+
+        def __call__(self, x):
+            return x + 1
+
+    assert pipe.compile(Counter(), Counter())(1) == 3
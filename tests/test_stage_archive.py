@@ -0,0 +1,50 @@
+import pytest
+from amshared import stage
+
+
+@pytest.mark.parametrize('suffix', ('.zip', '.tar', '.tar.gz'))
+def test_archive_stage(tmp_path, dataflow, suffix):
+    stg = stage.Stage(tmp_path / 'stage', index_keys=['format'])
+    stg.save(dataflow)
+    archive_path = tmp_path / f'stage{suffix}'
+    assert stg.export_archive(archive_path) == len(dataflow) * 2 + 1
+    archived = stage.Stage(archive_path, backend=stage.ArchiveBackend(),
+                           index_keys=['format'])
+    requests = (
+        {'rubric': 'post/mail'},
+        {'rubric': 'post/mail', 'name': 'chain', 'part': '*'},
+        {'rubric': 'post/mail', 'name': '*', 'part': False},
+        {'rubric': 'post/mail', 'name': 'unique', 'read_offset': 5,
+         'read_length': 2},
+    )
+    for request in requests:
+        assert archived.load(request) == stg.load(request)
+    request = {'rubric': 'post/parcel', 'name': 'secret'}
+    assert archived.payload(request).reveal() == stg.payload(request).reveal()
+    assert archived.query(where={'format': 'json'}) == stg.query(
+        where={'format': 'json'})
+    assert archived.usage() == stg.usage()
+    metadata, _ = archived.save([({'rubric': 'new'}, 'Nope')])[0]
+    assert metadata['error'] == 'PermissionError'
+    metadata, _ = archived.delete(request)[0]
+    assert metadata['error'] == 'PermissionError'
+    archived.backend.close()
+
+
+def test_archive_memory_stage(tmp_path, dataflow):
+    stg = stage.Stage('stage', backend=stage.MemoryBackend())
+    stg.save(dataflow)
+    archive_path = tmp_path / 'stage.zip'
+    assert stg.export_archive(archive_path) == len(dataflow) * 2
+    archived = stage.Stage(archive_path, backend=stage.ArchiveBackend(),
+                           index_keys=['format'], track_usage=True)
+    request = {'rubric': 'post/mail', 'name': 'chain', 'part': '*'}
+    assert archived.load(request) == stg.load(request)
+    # no logs in archive, indexes and usage are kept in memory
+    assert archived.query(where={'format': 'json'}) == stg.query(
+        where={'format': 'json'})
+    scanned = stage.Stage(archive_path, backend=stage.ArchiveBackend())
+    assert archived.usage() == scanned.usage()
+    assert archived.usage()['objects'] == stg.usage()['objects']
+    with pytest.raises(ValueError):
+        stg.export_archive(tmp_path / 'stage.rar')
@@ -1,8 +1,13 @@
+import io
+import os
+import time
 import pytest
 import json
 import pickle
 from amshared import stage
+from amshared.stage import joiners
 from pathlib import Path
+from .conftest import Concealed
 
 
 def test_stage_bad_start(tmp_path, dataflow):
@@ -154,3 +159,264 @@ def test_stage_load_exception(tmp_path, dataflow):
     badflow = [({'rubric': 'Non-Existent'}, None)]
     returnflow = stg.load(badflow)  # Silently returns empty dataflow
     assert returnflow == []  # i.e. no exception raised
+
+
+def test_stage_save_many(tmp_path, dataflow):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stg = stage.Stage(stage_folder_path)
+    stg.save([({'rubric': 'post/mail', 'name': 'chain', 'part': 2,
+                'format': 'txt'}, 'Existing')])
+    manyflow = [el for el in dataflow]
+    manyflow.append(({'rubric': 'post/mail', 'name': 'chain', 'part': True,
+                      'format': 'txt'}, 'Appended'))
+    manyflow.append(({'format': 'Non-Existent'}, None))
+    returnflow = stg.save_many(manyflow)
+    assert len(returnflow) == len(manyflow)
+    assert sum('error' in m for m, c in returnflow) == 1
+    rbc = stage.Rubric(stg, 'post/mail')
+    assert rbc.heap_parts == [1, 2, 3]
+    assert rbc.get_name_parts('chain') == [1, 2, 10, 11]
+    request = {'rubric': 'post/mail', 'name': 'chain', 'part': 11}
+    assert stg.payload(request) == 'Appended'
+    assert stg.payload({'rubric': 'post/mail'}) == stg.payload(
+        {'rubric': 'post/mail', 'format': 'json'})
+    request = {'rubric': 'post/parcel', 'name': 'secret'}
+    assert stg.payload(request).reveal() == Concealed().reveal()
+
+
+def test_stage_save_many_batches(tmp_path):
+    stg = stage.Stage(tmp_path / 'stage')
+    manyflow = [({'name': 'chain', 'part': True}, str(i)) for i in range(7)]
+    returnflow = stg.save_many(manyflow, batch_size=3)
+    assert [m['part'] for m, c in returnflow] == [*range(1, 8)]
+    assert stg.payload({'name': 'chain', 'part': 7}) == '6'
+
+
+def test_stage_save_many_reused_meta(tmp_path):
+    stg = stage.Stage(tmp_path / 'stage')
+
+    def manyflow():
+        meta = {'name': 'chain', 'part': True}
+        for i in range(3):
+            meta['seq'] = i
+            yield meta, str(i)
+
+    stg.save_many(manyflow())
+    loaded = stg.load({'name': 'chain', 'part': True})
+    assert [m['seq'] for m, c in loaded] == [0, 1, 2]
+
+    def namedflow():
+        meta = {}
+        for i in range(4):
+            meta['name'] = f"n{i}"
+            yield meta, str(i)
+
+    saved = stg.save_many(namedflow(), batch_size=10)
+    assert [m['name'] for m, c in saved] == ['n0', 'n1', 'n2', 'n3']
+
+
+def test_gen_dataflow():
+    import numpy as np
+    import pandas as pd
+    deep = 'bottom'
+    for _ in range(5000):
+        deep = [deep]
+    assert [*stage.gen_dataflow(deep)] == [({}, 'bottom')]
+    array = np.arange(3)
+    df = pd.DataFrame({'a': [1, 2]})
+    flow = [*stage.gen_dataflow([array, (df, b'raw'), {'name': 'x'}])]
+    assert len(flow) == 4
+    assert flow[0][1] is array and flow[1][1] is df
+    assert flow[2] == ({}, b'raw') and flow[3] == ({'name': 'x'}, None)
+    batches = [*stage.gen_dataflow(range(5), batch_size=2)]
+    assert batches == [[({}, 0), ({}, 1)], [({}, 2), ({}, 3)], [({}, 4)]]
+
+
+def test_stage_load_range(tmp_path):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stg = stage.Stage(stage_folder_path)
+    records = b'0123456789' * 3
+    stg.save([
+        ({'rubric': 'capture', 'name': 'big', 'part': True, 'format': 'bin'},
+         records),
+        ({'rubric': 'capture', 'name': 'big', 'part': True, 'format': 'txt'},
+         records.decode()),
+        ({'rubric': 'capture', 'name': 'pickled'}, records)
+    ])
+    request = {'rubric': 'capture', 'name': 'big', 'part': True,
+               'read_offset': 12, 'read_length': 3}
+    loaded = stg.load(request)
+    assert [c for m, c in loaded] == [b'234', '234']
+    assert all(m['read_offset'] == 12 and m['read_length'] == 3
+               for m, c in loaded)
+    request = {'rubric': 'capture', 'name': 'big', 'part': 1,
+               'read_offset': -4}
+    assert stg.payload(request) == b'6789'
+    assert 'read_length' not in stg.load(request)[0][0]  # None not echoed
+    request = {'rubric': 'capture', 'name': 'pickled', 'read_length': 1}
+    metadata, content = stg.load(request)[0]
+    assert metadata['error'] == 'NotImplementedError'
+    saved = stg.save([({'rubric': 'capture', 'name': 'a', 'offset': 10,
+                        'length': 2}, records)])
+    assert stg.load(saved)[0][1] == records  # custom keys, full content
+
+
+def test_stage_snapshot(tmp_path, dataflow):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stg = stage.Stage(stage_folder_path)
+    stg.save(dataflow)
+    with pytest.raises(FileExistsError):
+        stg.snapshot(tmp_path)
+    snap = stg.snapshot(tmp_path / 'snapshot', reflink=True)
+    request = {'rubric': 'post/mail', 'name': 'unique', 'format': 'txt'}
+    assert snap.payload(request) == 'From Mars'
+    stg.save([(request, 'From Venus')])
+    stg.save_many([({**request, 'name': 'chain', 'part': 1}, 'Part 1')])
+    stg.delete([({'rubric': 'post/parcel', 'name': 'secret'}, None)])
+    assert stg.payload(request) == 'From Venus'
+    assert snap.payload(request) == 'From Mars'
+    request = {'rubric': 'post/mail', 'name': 'chain', 'part': 1}
+    assert snap.payload(request) == dict(message='Part one')
+    assert snap.payload({'rubric': 'post/parcel', 'name': 'secret'})
+    assert not list(stage_folder_path.glob('**/.*'))  # no temporary files
+
+
+@pytest.mark.parametrize('index_keys', ((), ('expires',)))
+def test_stage_reap(tmp_path, index_keys):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stg = stage.Stage(stage_folder_path, index_keys=index_keys,
+                      ttl={'scratch': 100, 'scratch/keep': 10 ** 6})
+    stg.save([
+        ({'rubric': 'scratch', 'name': 'old'}, 1),
+        ({'rubric': 'scratch', 'name': 'long', 'ttl': 10 ** 6}, 2),
+        ({'rubric': 'scratch/sub'}, 3),
+        ({'rubric': 'scratch/keep'}, 4),
+        ({'rubric': 'main', 'name': 'short', 'part': 1, 'ttl': 10}, 5),
+        ({'rubric': 'main', 'name': 'forever'}, 6),
+    ])
+    for meta_path in stage_folder_path.glob('metadata/**/*.meta'):
+        os.utime(meta_path, (0, time.time() - 200))  # saved long ago
+    reaped = stg.reap(now=time.time() + 50)
+    assert sorted((m['rubric'], m['name']) for m, c in reaped) == [
+        ('main', 'short'), ('scratch', 'old'), ('scratch/sub', '__heap__')
+    ]
+    assert stg.reap(now=time.time() + 50) == []
+    assert len(stg.query()) == 3
+
+
+def test_stage_reaper(tmp_path):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stg = stage.Stage(stage_folder_path)
+    stg.save([({'rubric': 'scratch', 'name': 'short', 'ttl': 0}, 1)])
+    with stg.start_reaper(interval=0.01) as reaper:
+        deadline = time.time() + 5
+        while not reaper.reaped and time.time() < deadline:
+            time.sleep(0.01)
+    assert reaper.reaped == 1
+    assert stg.query() == []
+
+    # metadata being written is skipped, failed reap does not stop reaper
+    (stage_folder_path / 'metadata/scratch').mkdir(exist_ok=True)
+    (stage_folder_path / 'metadata/scratch/partial.meta').write_bytes(b'{"')
+    stg.save([({'rubric': 'scratch', 'name': 'again', 'ttl': 0}, 1)])
+    failures = iter([OSError('Disk is busy')])
+    reap = stg.reap
+
+    def flaky_reap(now=None):
+        for error in failures:
+            raise error
+        return reap(now)
+
+    stg.reap = flaky_reap
+    with stg.start_reaper(interval=0.01) as reaper:
+        deadline = time.time() + 5
+        while not reaper.reaped and time.time() < deadline:
+            time.sleep(0.01)
+    assert reaper.errors == 1 and reaper.reaped == 1
+
+
+def test_stage_reaper_usage(tmp_path):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stg = stage.Stage(stage_folder_path, track_usage=True)
+    stg.save_many(({'rubric': 'scratch', 'name': f"n{i}", 'ttl': 0}, i)
+                  for i in range(300))
+    with stg.start_reaper(interval=0.001) as reaper:
+        for i in range(300):  # writes share accounting with reaper
+            stg.save([({'rubric': 'kept', 'name': f"n{i}"}, i)])
+        deadline = time.time() + 5
+        while reaper.reaped < 300 and time.time() < deadline:
+            time.sleep(0.01)
+    assert reaper.errors == 0 and reaper.reaped == 300
+    assert stg.usage() == stage.Stage(stage_folder_path).usage()  # scan
+
+
+def test_stage_usage(tmp_path, dataflow):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stg = stage.Stage(stage_folder_path, quota={'post/parcel': 1})
+    assert stg.usage() == {'bytes': 0, 'objects': 0}
+    stg.save(dataflow)
+    disk_bytes = sum(p.stat().st_size
+                     for top in ('content', 'metadata')
+                     for p in (stage_folder_path / top).glob('**/*')
+                     if p.is_file())
+    assert stg.usage() == {'bytes': disk_bytes, 'objects': len(dataflow)}
+    assert stage.Stage(stage_folder_path).usage() == stg.usage()  # scan
+    other = stage.Stage(stage_folder_path, track_usage=True)
+    assert other.usage() == stg.usage()  # same log
+    mail_usage = stg.usage('post/mail')
+    request = {'rubric': 'post/mail', 'name': 'unique', 'format': 'txt'}
+    other.save_many([(request, 'From Mars' * 2)])
+    assert stg.usage('post/mail') == {
+        'bytes': mail_usage['bytes'] + len('From Mars'),
+        'objects': mail_usage['objects']
+    }
+    stg.delete([request])
+    assert stg.usage('post/mail')['objects'] == mail_usage['objects'] - 1
+    returnflow = stg.save([({'rubric': 'post/parcel'}, 'Over quota')])
+    assert returnflow[0][0]['error'] == 'QuotaExceeded'
+    assert stage.Stage(stage_folder_path).usage() == stg.usage()
+
+
+def test_stage_delete_untracked(tmp_path, dataflow):
+    stg = stage.Stage(tmp_path / 'stage')
+    stg.save(dataflow)
+    stats = []
+    stat = stg.backend.stat
+    stg.backend.stat = lambda path: stats.append(path) or stat(path)
+    stg.delete([({'rubric': 'post/parcel', 'name': 'secret'}, None)])
+    assert stats == []  # not accounted without track_usage
+
+
+@pytest.mark.parametrize('backend', (None, stage.MemoryBackend()))
+def test_stage_copy_payload(tmp_path, backend):
+    stg = stage.Stage(tmp_path / 'stage', backend=backend)
+    lines = [f'Line {i}\n' for i in range(1, 12)]
+    request = {'rubric': 'log', 'name': 'lines', 'part': True, 'format': 'txt'}
+    stg.save_many([(request, line) for line in lines])
+    dest_path = tmp_path / 'lines.txt'
+    with open(dest_path, 'wb') as file:
+        file.write(b'Header\n')
+        copied = stg.copy_payload({**request, 'part': '*'}, file)
+        file.write(b'Footer\n')
+    assert copied == len(''.join(lines))
+    assert dest_path.read_text() == ''.join(['Header\n', *lines, 'Footer\n'])
+    stg.copy_payload({**request, 'part': 11}, dest_path)
+    assert dest_path.read_text() == lines[-1]
+    buffer = io.BytesIO()
+    stg.copy_payload({**request, 'part': True}, buffer)
+    assert buffer.getvalue().decode() == ''.join(lines)
+    read_fd, write_fd = os.pipe()
+    with open(read_fd, 'rb') as reader, open(write_fd, 'wb') as pipe:
+        stg.copy_payload({**request, 'part': True}, pipe)
+        pipe.close()
+        assert reader.read().decode() == ''.join(lines)
+
+
+def test_stage_payload_joiners(tmp_path):
+    stg = stage.Stage(tmp_path / 'stage')
+    request = {'rubric': 'log', 'name': 'lines', 'part': True, 'format': 'txt'}
+    stg.save_many([(request, f'Line {i}\n') for i in range(3)])
+    text = stg.payload(request, joiner=joiners.into(io.StringIO()))
+    assert text.getvalue() == 'Line 0\nLine 1\nLine 2\n'
+    with stg.payload(request, joiner=joiners.spooled(max_size=8)) as file:
+        assert file.read() == b'Line 0\nLine 1\nLine 2\n'
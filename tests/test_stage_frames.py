@@ -0,0 +1,39 @@
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from amshared import stage
+from pathlib import Path
+
+frame = pd.DataFrame({
+    'source': ['x', 'y', 'x', 'z', 'y'],
+    'day': [1, 1, 2, 2, 3],
+    'value': np.arange(5, dtype=np.float64)
+})
+pickle5 = pytest.param('pickle5', marks=pytest.mark.skipif(
+    pickle.HIGHEST_PROTOCOL < 5, reason='Python 3.8+'))
+
+
+@pytest.mark.parametrize('fmt', (pickle5, 'pickle'))
+def test_stage_frame_groups(tmp_path, fmt):
+    stg = stage.Stage(Path(tmp_path / 'stage'))
+    saved = stg.save_frame(frame, 'frames', 'values', by='source', fmt=fmt)
+    assert [m['group'] for m, c in saved] == ['x', 'y', 'z']
+    loaded = stg.load_frame('frames', 'values')
+    assert loaded.sort_index().equals(frame)
+    loaded = stg.load_frame('frames', 'values', groups=['z', 'x'])
+    assert loaded.sort_index().equals(frame[frame.source != 'y'])
+    saved = stg.save_frame(frame, 'frames', 'values', by=['source', 'day'])
+    assert len(saved) == 5
+    assert len(stage.Rubric(stg, 'frames').get_name_parts('values')) == 5
+    loaded = stg.load_frame('frames', 'values', groups=[('x', 2)])
+    assert loaded.equals(frame.iloc[[2]])
+
+
+def test_stage_frame_chunks(tmp_path):
+    stg = stage.Stage(Path(tmp_path / 'stage'))
+    assert len(stg.save_frame(frame, 'frames', 'values', chunk_size=2)) == 3
+    assert len(stg.save_frame(frame, 'frames', 'values', append=True)) == 1
+    loaded = stg.load_frame('frames', 'values', ignore_index=True)
+    assert loaded.equals(pd.concat([frame, frame], ignore_index=True))
+    assert stg.load_frame('frames', 'nothing') is None
@@ -1,4 +1,10 @@
+import datetime
+import decimal
+import types
+import pytest
+import numpy as np
 from amshared import stage
+from amshared.stage import jsoncodec
 from amshared.helpers import iter_equal
 from pathlib import Path
 
@@ -10,3 +16,58 @@ def test_json_driver(tmp_path, json_samples):
     stg.save([(metadata, json_samples)])
     samples = stg.payload(metadata)  # read back
     assert all(iter_equal(s, samples[i]) for i, s in enumerate(json_samples))
+
+
+def test_json_driver_stdlib(tmp_path, json_samples, monkeypatch):
+    monkeypatch.setattr(jsoncodec, 'orjson', None)
+    test_json_driver(tmp_path, json_samples)
+
+
+@pytest.mark.parametrize('fast', (True, False))
+def test_json_codec_types(fast, monkeypatch):
+    if not fast:
+        monkeypatch.setattr(jsoncodec, 'orjson', None)
+    content = {
+        'date': datetime.date(2026, 1, 2),
+        'time': datetime.datetime(2026, 1, 2, 3, 4, 5),
+        'decimal': decimal.Decimal('1.5'),
+        'set': {1},
+        'gen': (i for i in range(2)),
+        'bool': np.bool_(True),
+        'matrix': np.eye(2, dtype=np.int32),
+        'unknown': object(),
+        'mapping': types.MappingProxyType({'a': 1}),
+        'bytes': b'ab',
+        'nan': float('nan'),
+        'inf': np.array((-np.inf, 1.5)),
+        'text': 'NaN'
+    }
+    assert jsoncodec.loads(jsoncodec.dumps(content)) == {
+        'date': '2026-01-02',
+        'time': '2026-01-02T03:04:05',
+        'decimal': 1.5,
+        'set': [1],
+        'gen': [0, 1],
+        'bool': True,
+        'matrix': [[1, 0], [0, 1]],
+        'unknown': None,
+        'mapping': {'a': 1},
+        'bytes': [97, 98],
+        'nan': None,
+        'inf': [None, 1.5],
+        'text': 'NaN'
+    }
+
+
+def test_jsonl_driver(tmp_path):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stg = stage.Stage(stage_folder_path)
+    metadata = {'rubric': 'json', 'name': 'records', 'format': 'jsonl'}
+    records = [{'n': np.int64(i), 'text': f'Record №{i}'} for i in range(3)]
+    stg.save([(metadata, (record for record in records))])
+    assert stg.payload(metadata) == [
+        {'n': i, 'text': f'Record №{i}'} for i in range(3)
+    ]
+    driver = stg.iodp['jsonl']
+    path = stage_folder_path / 'content/json/records.jsonl'
+    assert next(driver.iread(path)) == {'n': 0, 'text': 'Record №0'}
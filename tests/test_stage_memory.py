@@ -0,0 +1,63 @@
+import pytest
+from amshared import stage
+
+
+@pytest.fixture()
+def stages(tmp_path):
+    return (stage.Stage(tmp_path / 'stage'),
+            stage.Stage('stage', backend=stage.MemoryBackend()))
+
+
+def test_memory_stage_parity(stages, dataflow):
+    file_stg, memory_stg = stages
+    requests = (
+        {'rubric': 'post/mail'},
+        {'rubric': 'post/mail', 'name': 'chain', 'part': '*'},
+        {'rubric': 'post/mail', 'name': 'unique'},
+        {'rubric': 'post/mail', 'name': 'unique', 'read_offset': 5},
+        {'rubric': 'post/mail', 'name': '*', 'part': False},
+        {'rubric': 'post/mail', 'name': '*', 'part': True},
+        {'rubric': 'Non-Existent'},
+    )
+    assert file_stg.save(dataflow) == memory_stg.save(dataflow)
+    for request in requests:
+        assert file_stg.load(request) == memory_stg.load(request)
+    text = [({'rubric': 'text', 'name': 'euro', 'format': 'txt'}, '€1 = €1')]
+    file_stg.save(text)
+    memory_stg.save(text)
+    request = {'rubric': 'text', 'name': 'euro', 'read_offset': 3,
+               'read_length': 6}  # in bytes, cut characters are lost
+    assert memory_stg.payload(request) == file_stg.payload(request) == '1 = '
+    rbc = stage.Rubric(memory_stg, 'post/mail')
+    assert rbc.exists()
+    assert rbc.atomic_names == ['unique']
+    assert rbc.multipart_names == ['chain']
+    assert rbc.heap_parts == [1, 2, 3]
+    request = {'rubric': 'post/parcel', 'name': 'secret'}
+    assert memory_stg.payload(request) is dataflow[-1][1]  # not serialized
+    badflow = [({'format': 'Non-Existent'}, None)]
+    assert file_stg.save(badflow) == memory_stg.save(badflow)
+    for stg in stages:
+        stg.delete({'rubric': 'post/mail', 'name': '*'})
+        stg.delete({'rubric': 'post/mail', 'name': '*', 'part': True})
+        stg.delete(request)
+    assert not stage.Rubric(memory_stg, 'post/parcel').exists()
+    for request in requests:
+        assert file_stg.load(request) == memory_stg.load(request)
+
+
+def test_memory_stage_services(dataflow):
+    backend = stage.MemoryBackend()
+    stg = stage.Stage('stage', backend=backend, index_keys=['format'],
+                      track_usage=True)
+    stg.save_many(dataflow)
+    assert len(stg.query(where={'format': 'json'})) == 3
+    assert stg.usage()['objects'] == len(dataflow)
+    snap = stg.snapshot('snapshot')
+    stg.save([({'rubric': 'short', 'ttl': 0}, 'Expiring')])
+    assert len(stg.reap()) == 1
+    stg.delete({'rubric': 'post/mail', 'name': '*', 'part': True})
+    assert len(stg.query(where={'format': 'json'})) == 1
+    assert len(snap.query(where={'format': 'json'})) == 3
+    assert snap.usage()['objects'] == len(dataflow)
+    assert stg.usage() == stage.Stage('stage', backend=backend).usage()
@@ -59,6 +59,8 @@ def test_stage_metadata_part():
     meta = MetaData({MK_NAME: 0, MK_PART: True})
     assert meta[MK_PART] == STAGE_WILD
     assert meta.is_atomic is False
+    meta[MK_PART] = None
+    assert meta.is_atomic is True
 
 
 def test_stage_metadata_format_sfx():
@@ -73,3 +75,33 @@ def test_stage_metadata_format_sfx():
     assert meta.sfx == '.txt'
     meta.sfx = None
     assert meta.sfx == '.html'
+
+
+def test_stage_metadata_dict_interop():
+    source = {MK_NAME: 'main', MK_PART: 1, 'custom': 'value'}
+    meta = MetaData(source)
+    assert meta['custom'] == 'value'
+    assert dict(meta) == meta.data == {
+        MK_PAYLOAD: True, MK_RUBRIC: STAGE_RUBRIC_EMPTY, MK_NAME: 'main',
+        MK_PART: 1, MK_FORMAT: '', 'custom': 'value'
+    }
+    assert MetaData(meta).data == meta.data
+    assert meta.get('missing', 0) == 0
+    # custom keys are copied on write, source is intact
+    other = meta.copy()
+    other['custom'] = 'changed'
+    other['new'] = 1
+    del other[MK_PART]
+    assert meta['custom'] == 'value' and 'new' not in meta
+    assert meta.is_atomic is False and other.is_atomic is True
+    assert source == {MK_NAME: 'main', MK_PART: 1, 'custom': 'value'}
+    assert other.pop('new') == 1 and other.pop('new', None) is None
+    assert len(other) == 5
+    source['custom'] = 'reused'  # producer may reuse its dictionary
+    assert meta['custom'] == 'value'
+
+
+def test_stage_metadata_wildcard():
+    meta = MetaData({MK_PART: False})
+    assert meta[MK_NAME] == STAGE_WILD
+    assert MK_PART not in meta
@@ -0,0 +1,31 @@
+import pickle
+import pytest
+import numpy as np
+import pandas as pd
+from amshared import stage
+from pathlib import Path
+
+
+@pytest.mark.skipif(pickle.HIGHEST_PROTOCOL < 5, reason='Python 3.8+')
+def test_pickle5_driver(tmp_path):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stg = stage.Stage(stage_folder_path)
+    array = np.arange(100000, dtype=np.float64)
+    frame = pd.DataFrame({'a': array, 'b': array * 2})
+    small = {'small': np.arange(3), 'text': 'Not out-of-band'}
+    metadata = {'rubric': 'pickle5', 'name': 'frames', 'format': 'pickle5'}
+    stg.save([
+        ({**metadata, 'part': 1}, array),
+        ({**metadata, 'part': 2}, frame),
+        ({**metadata, 'part': 3}, small)
+    ])
+    loaded = stg.payload({**metadata, 'part': True})
+    loaded_array, loaded_frame, loaded_small = loaded
+    assert np.array_equal(loaded_array, array)
+    loaded_array[0] = -1  # copy-on-write mapping is writable...
+    assert stg.payload({**metadata, 'part': 1})[0] == 0  # ...file is intact
+    assert loaded_frame.equals(frame)
+    assert np.array_equal(loaded_small['small'], small['small'])
+    assert loaded_small['text'] == small['text']
+    stg.save([({**metadata, 'part': 1}, np.arange(10.))])
+    assert loaded_array[-1] == array[-1]  # mapped file is replaced, not cut
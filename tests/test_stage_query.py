@@ -0,0 +1,57 @@
+import pytest
+from amshared import stage
+from pathlib import Path
+
+reports = [
+    ({'rubric': 'reports', 'name': 'daily', 'part': True, 'format': 'txt',
+      'source': source, 'date': date, 'status': status}, f'{source} {date}')
+    for source, date, status in (
+        ('x', '2025-12-31', 'ok'),
+        ('x', '2026-01-01', 'ok'),
+        ('y', '2026-01-02', 'failed'),
+        ('x', '2026-01-03', 'failed'),
+    )
+]
+
+
+@pytest.mark.parametrize('index_keys', ((), ('source', 'date')))
+def test_stage_query(tmp_path, index_keys):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stg = stage.Stage(stage_folder_path, index_keys=index_keys)
+    stg.save(reports)
+    stg.save([({'rubric': 'other', 'name': 'note', 'source': 'x'}, 'Note')])
+    where = {'source': 'x', 'date': ('>=', '2026-01-01')}
+    found = stg.query(rubric='reports', where=where)
+    assert sorted(m['date'] for m, c in found) == ['2026-01-01', '2026-01-03']
+    assert all(c is None for m, c in found)
+    where['status'] = ('in', ('failed', 'lost'))
+    found = stg.query(rubric='reports', where=where, content=True)
+    assert [c for m, c in found] == ['x 2026-01-03']
+    assert len(stg.query(where={'source': 'x'})) == 4
+    assert len(stg.query(rubric='other')) == 1
+    stg.delete([({'rubric': 'reports', 'name': 'daily', 'part': 4}, None)])
+    assert stg.query(rubric='reports', where=where) == []
+    assert len(stg.query(where={'date': ('<', 0)})) == 0  # not comparable
+
+
+def test_stage_index_rebuild(tmp_path):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stage.Stage(stage_folder_path).save(reports)
+    stg = stage.Stage(stage_folder_path, index_keys=['status'])
+    assert len(stg.query(where={'status': 'ok'})) == 2
+    other = stage.Stage(stage_folder_path, index_keys=['status'])
+    other.save([({'rubric': 'reports', 'status': 'ok'}, None)])
+    assert len(stg.query(where={'status': 'ok'})) == 3  # sees other's save
+    snap = stg.snapshot(tmp_path / 'snapshot')
+    stg.delete([({'rubric': 'reports', 'name': 'daily', 'part': 1}, None)])
+    assert len(stg.query(where={'status': 'ok'})) == 2
+    assert len(snap.query(where={'status': 'ok'})) == 3
+
+
+def test_stage_index_saved_before_query(tmp_path):
+    stage_folder_path = Path(tmp_path / 'stage')
+    stage.Stage(stage_folder_path).save(reports[:2])
+    stg = stage.Stage(stage_folder_path, index_keys=['status'])
+    stg.save(reports[2:])  # before the first query builds the logs
+    assert len(stg.query(where={'status': 'ok'})) == 2
+    assert len(stg.query(where={'status': 'failed'})) == 2
@@ -0,0 +1,79 @@
+import pytest
+from amshared import stage
+
+
+@pytest.fixture()
+def stages(tmp_path):
+    plain = stage.Stage(tmp_path / 'plain')
+    paths = [tmp_path / f"disk{n}" for n in range(3)]
+    with stage.ShardedStage(paths, track_usage=True) as sharded:
+        yield plain, sharded
+
+
+def test_sharded_stage_parity(stages, dataflow):
+    plain, sharded = stages
+    requests = (
+        {'rubric': 'post/mail'},
+        {'rubric': 'post/mail', 'name': 'chain', 'part': '*'},
+        {'rubric': 'post/mail', 'name': 'unique', 'read_offset': 5},
+        {'rubric': 'post/mail', 'name': '*', 'part': False},
+        {'rubric': 'post/mail', 'name': '*', 'part': True},
+        {'rubric': 'Non-Existent'},
+    )
+    assert plain.save(dataflow) == sharded.save(dataflow)
+    for request in requests:
+        assert plain.load(request) == sharded.load(request)
+    assert plain.load(requests) == sharded.load(requests)
+    assert plain.usage() == sharded.usage()
+    request = {'rubric': 'post/parcel', 'name': 'secret'}
+    assert sharded.payload(request).reveal() == dataflow[-1][1].reveal()
+    assert plain.delete(requests[-2]) == sharded.delete(requests[-2])
+    assert plain.load(requests) == sharded.load(requests)
+
+
+def test_sharded_stage_reused_meta(stages):
+    plain, sharded = stages
+
+    def reusedflow():
+        meta = {'rubric': 'r'}
+        for i in range(4):
+            meta['name'] = f"n{i}"
+            yield meta, str(i)
+
+    for save in (sharded.save, sharded.save_many, plain.save):
+        saved = save(reusedflow())  # save_many returns shard order
+        assert sorted(m['name'] for m, c in saved) == ['n0', 'n1', 'n2', 'n3']
+    request = {'rubric': 'r', 'name': '*'}
+    assert sorted(c for m, c in sharded.load(request)) == ['0', '1', '2', '3']
+
+
+def test_sharded_stage_placement(stages):
+    _, sharded = stages
+    manyflow = [({'rubric': 'r', 'name': f"n{i}", 'part': True}, str(i))
+                for i in range(60)]
+    saved = sharded.save_many(manyflow, batch_size=25)
+    assert len(saved) == len(manyflow)
+    counts = [len(stage.Rubric(stg, 'r').multipart_names)
+              for stg in sharded.shards]
+    assert sum(counts) == 60 and all(counts)
+    for metadata, content in manyflow:
+        assert sharded.shard_of(metadata).payload(metadata) == content
+    assert len(sharded.load({'rubric': 'r', 'name': '*', 'part': True})) == 60
+    assert sharded.usage('r')['objects'] == 60
+    # appended shard takes over only a fraction of names
+    grown = stage.ShardedStage(sharded.shards + [stage.Stage(
+        sharded.shards[0].topmost.parent / 'disk3')])
+    moved = sum(grown.shard_index('r', f"n{i}") != sharded.shard_index(
+        'r', f"n{i}") for i in range(60))
+    grown.close()
+    assert 0 < moved < 30
+
+
+def test_sharded_stage_snapshot(stages, tmp_path, dataflow):
+    _, sharded = stages
+    sharded.save(dataflow)
+    with sharded.snapshot(tmp_path / f"copy{n}" for n in range(3)) as copy:
+        assert [m for m, _ in copy.load(dataflow)] == [
+            m for m, _ in sharded.load(dataflow)]
+    with pytest.raises(ValueError):
+        sharded.snapshot([tmp_path / 'copy'])